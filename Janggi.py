@@ -1,88 +1,103 @@
 # Author: Dylan Smith
-# Description: A simple implementation of the board game Janggi, using PyGame
+# Description: A simple implementation of the board game Janggi. The rules
+# engine has no dependencies; the PyGame interface is in gui.py.
 
-import pygame
-from pygame.locals import *
-from copy import *
+import os
+import random
+from collections import OrderedDict
+from evaluation import square_scores
+
+
+# Piece types, in the order of their integer codes below, and the image of
+# a red piece of each type. Blue images are lower case.
+PIECE_TYPES = ('general', 'guard', 'horse', 'elephant', 'chariot', 'cannon',
+               'soldier')
+PIECE_IMAGES = {'general': 'G', 'guard': 'U', 'horse': 'H', 'elephant': 'E',
+                'chariot': 'C', 'cannon': 'N', 'soldier': 'S'}
 
 
 class Piece:
     """Creates a Janggi piece that defines the piece's team, type,
-    and piece-specific rules."""
+    and piece-specific rules. Pieces cannot be changed, so there is one
+    shared instance for each team and type: Piece('red', 'chariot', 'C')
+    always returns the same object."""
+    
+    __slots__ = ('_team', '_type', '_image', '_moves', '_blocked',
+                 '_palace_only')
+    
+    # Valid moves of each type, as (y, x) offsets. Soldiers move forward,
+    # which differs by team.
+    MOVES = {
+        'general': ((0, 0), (1, 0), (1, 1), (1, -1), (-1, 0), (-1, 1),
+                    (-1, -1), (0, 1), (0, -1)),
+        'guard': ((0, 0), (1, 0), (1, 1), (1, -1), (-1, 0), (-1, 1),
+                  (-1, -1), (0, 1), (0, -1)),
+        'chariot': tuple((0, num) for num in range(-8, 8)) +
+        tuple((num, 0) for num in range(-9, 9)),
+        'elephant': ((2, 3), (2, -3), (-2, 3), (-2, -3), (3, 2), (3, -2),
+                     (-3, 2), (-3, -2), (0, 0)),
+        'horse': ((1, 2), (1, -2), (-1, 2), (-1, -2), (2, 1), (2, -1),
+                  (-2, 1), (-2, -1), (0, 0)),
+        'cannon': tuple((0, num) for num in range(-8, -2)) +
+        tuple((0, num) for num in range(2, 8)) +
+        tuple((num, 0) for num in range(-9, 2)) +
+        tuple((num, 0) for num in range(2, 9)),
+    }
+    SOLDIER_MOVES = {'red': ((0, 0), (1, 0), (0, -1), (0, 1)),
+                     'blue': ((0, 0), (-1, 0), (0, -1), (0, 1))}
+    # Squares that block each move of a horse or elephant when occupied.
+    BLOCKED = {
+        'elephant': {(2, 3): ((0, 1), (1, 2)), (2, -3): ((0, -1), (1, -2)),
+                     (-2, 3): ((0, 1), (-1, 2)),
+                     (-2, -3): ((0, -1), (-1, -2)),
+                     (3, 2): ((1, 0), (2, 1)), (3, -2): ((1, 0), (2, -1)),
+                     (-3, 2): ((-1, 0), (-2, 1)),
+                     (-3, -2): ((-1, 0), (-2, -1)), (0, 0): ()},
+        'horse': {(1, 2): ((0, 1),), (1, -2): ((0, -1),),
+                  (-1, 2): ((0, 1),), (-1, -2): ((0, -1),),
+                  (2, 1): ((1, 0),), (2, -1): ((1, 0),),
+                  (-2, 1): ((-1, 0),), (-2, -1): ((-1, 0),), (0, 0): ()},
+    }
+    _instances = {}  # The shared Piece of each (team, type)
     
-    def __init__(self, team, type, image):
+    def __new__(cls, team, type, image=None):
         """
-        Initializes the parameters for the Janggi playing piece.
+        Returns the shared Piece of a team and type, creating it the first
+        time it is asked for.
         :param team: String, the team's name.
         :param type: String, the Piece's identifying name.
-        :param image: String, the Piece's identifying symbol.
-        """
-        self._team = team
-        self._type = type
-        self._image = image
-        self._moves = []
-        self._blocked = None
-        self._palace_only = False
-        if type == 'general':
-            # Set valid moves for general pieces
-            self._palace_only = True
-            self._moves = [[0, 0], [1, 0], [1, 1], [1, -1], [-1, 0], [-1, 1],
-                           [-1, -1], [0, 1], [0, -1]]
-        elif type == 'guard':
-            # Set valid moves for guard pieces
-            self._palace_only = True
-            self._moves = [[0, 0], [1, 0], [1, 1], [1, -1], [-1, 0], [-1, 1],
-                           [-1, -1], [0, 1], [0, -1]]
-        elif type == 'chariot':
-            # Set valid moves for chariot pieces
-            self._moves = []
-            for num in range(-8, 8):
-                self._moves.append([0, num])
-            for num in range(-9, 9):
-                self._moves.append([num, 0])
-        elif type == 'elephant':
-            # Set valid moves and blockable squares for horse pieces
-            self._moves = [[2, 3], [2, -3], [-2, 3], [-2, -3], [3, 2], [3, -2],
-                           [-3, 2], [-3, -2], [0, 0]]
-            self._blocked = {0: [[0, 1], [1, 2]],
-                             1: [[0, -1], [1, -2]],
-                             2: [[0, 1], [-1, 2]],
-                             3: [[0, -1], [-1, -2]],
-                             4: [[1, 0], [2, 1]],
-                             5: [[1, 0], [2, -1]],
-                             6: [[-1, 0], [-2, 1]],
-                             7: [[-1, 0], [-2, -1]],
-                             8: []}
-        elif type == 'horse':
-            # Set valid moves and blockable squares for horse pieces
-            self._moves = [[1, 2], [1, -2], [-1, 2], [-1, -2], [2, 1], [2, -1],
-                           [-2, 1], [-2, -1], [0, 0]]
-            self._blocked = {0: [[0, 1]],
-                             1: [[0, -1]],
-                             2: [[0, 1]],
-                             3: [[0, -1]],
-                             4: [[1, 0]],
-                             5: [[1, 0]],
-                             6: [[-1, 0]],
-                             7: [[-1, 0]],
-                             8: []}
-        elif type == 'cannon':
-            # Set valid moves for cannon pieces
-            self._moves = []
-            for num in range(-8, -2):
-                self._moves.append([0, num])
-            for num in range(2, 8):
-                self._moves.append([0, num])
-            for num in range(-9, 2):
-                self._moves.append([num, 0])
-            for num in range(2, 9):
-                self._moves.append([num, 0])
-        elif type == 'soldier':
-            # Set valid moves for soldier pieces
-            if self._team == 'red':
-                self._moves = [[0, 0], [1, 0], [0, -1], [0, 1]]
-            else:
-                self._moves = [[0, 0], [-1, 0], [0, -1], [0, 1]]
+        :param image: String, the Piece's identifying symbol. By default,
+        the type's letter in PIECE_IMAGES, lower case for Blue.
+        :return: Piece.
+        """
+        piece = cls._instances.get((team, type))
+        if piece is None:
+            if type not in PIECE_IMAGES:
+                raise ValueError('unknown piece type %r' % type)
+            piece = object.__new__(cls)
+            default_image = PIECE_IMAGES[type] if team == 'red' \
+                else PIECE_IMAGES[type].lower()
+            set_slot = object.__setattr__
+            set_slot(piece, '_team', team)
+            set_slot(piece, '_type', type)
+            set_slot(piece, '_image', default_image)
+            set_slot(piece, '_moves', cls.SOLDIER_MOVES[team]
+                     if type == 'soldier' else cls.MOVES[type])
+            set_slot(piece, '_blocked', cls.BLOCKED.get(type))
+            set_slot(piece, '_palace_only', type in ('general', 'guard'))
+            cls._instances[team, type] = piece
+        if image is not None and image != piece._image:
+            raise ValueError('the %s %s has the image %r, not %r'
+                             % (team, type, piece._image, image))
+        return piece
+    
+    def __setattr__(self, name, value):
+        """Refuses to change a shared Piece."""
+        raise AttributeError('Piece objects cannot be changed')
+    
+    def __reduce__(self):
+        """Copies and unpickles to the shared Piece."""
+        return Piece, (self._team, self._type)
     
     def get_team(self):
         """Returns the piece's team."""
@@ -97,30 +112,446 @@ class Piece:
         return self._image
     
     def get_moves(self):
-        """Returns the set of valid moves for the piece."""
+        """Returns the tuple of valid (y, x) moves for the piece."""
         return self._moves
     
     def get_blocked(self, move):
         """
-        Returns the list of squares that, if occupied, prevents the unit
-        from moving.
+        Returns the squares that, if occupied, prevent the unit from
+        moving.
         :param move: Move being attempted by Horse or Elephant.
-        :return: None if Piece can't be blocked, Array otherwise.
+        :return: False if Piece can't be blocked, tuple of (y, x) offsets
+        otherwise, or None for a move the Piece cannot make.
         """
         if self._blocked is None:
             return False
-        key = 0
-        for index in self.get_moves():
-            if move == index:
-                blocked_moves = self._blocked[key]
-                return blocked_moves
-            key += 1
+        return self._blocked.get(tuple(move))
     
     def get_palace_only(self):
         """Returns if the piece can only be in the palace."""
         return self._palace_only
 
 
+# Integer piece codes used by compact boards: the type's position in
+# PIECE_TYPES plus one, with BLUE_CODE added for blue pieces. 0 is empty.
+BLUE_CODE = 8
+CODE_PIECES = [None] * 16
+PIECE_CODES = {}
+for _code, _type in enumerate(PIECE_TYPES, 1):
+    CODE_PIECES[_code] = Piece('red', _type, PIECE_IMAGES[_type])
+    CODE_PIECES[_code + BLUE_CODE] = Piece('blue', _type,
+                                           PIECE_IMAGES[_type].lower())
+    PIECE_CODES['red', _type] = _code
+    PIECE_CODES['blue', _type] = _code + BLUE_CODE
+# Pieces are shared, so each one can be looked up directly. None is empty.
+_PIECE_OBJECT_CODES = {CODE_PIECES[_code]: _code
+                       for _code in PIECE_CODES.values()}
+_PIECE_OBJECT_CODES[None] = 0
+
+
+CANNON_CODES = (PIECE_CODES['red', 'cannon'], PIECE_CODES['blue', 'cannon'])
+
+# Piece code of each image letter in position strings, see to_fen().
+FEN_CODES = {CODE_PIECES[_code].get_image(): _code
+             for _code in PIECE_CODES.values()}
+FEN_TEAMS = {'r': 'red', 'b': 'blue'}
+START_FEN = ('CEHU1UEHC/4G4/1N5N1/S1S1S1S1S/9/9/s1s1s1s1s/1n5n1/4g4/'
+             'cehu1uehc b -')
+
+
+def piece_code(piece):
+    """Returns the integer code of a Piece, or 0 for an empty square."""
+    return _PIECE_OBJECT_CODES[piece]
+
+
+# Squares of the two palaces, in [y, x] notation.
+PALACE = [[0, 3], [0, 4], [0, 5], [1, 3], [1, 4], [1, 5], [2, 3], [2, 4],
+          [2, 5], [7, 3], [7, 4], [7, 5], [8, 3], [8, 4], [8, 5], [9, 3],
+          [9, 4], [9, 5]]
+
+
+def build_move_table(piece):
+    """
+    Precomputes the moves of a piece from every square of the board.
+    :param piece: The Piece to build the table for.
+    :return: List indexed by origin square (y * 9 + x) of dicts mapping
+    each on-board destination index to the tuple of [y, x] squares between
+    the two: the squares that block a horse, elephant or chariot, and the
+    possible screens of a cannon.
+    """
+    table = []
+    for origin in range(90):
+        row, col = divmod(origin, 9)
+        moves = {}
+        for move in piece.get_moves():
+            end = [row + move[0], col + move[1]]
+            if not (0 <= end[0] < 10 and 0 <= end[1] < 9):
+                continue  # Destination off the board
+            if piece.get_palace_only() and end not in PALACE:
+                continue  # Guards and generals stay in the palace
+            blocked = piece.get_blocked(move)
+            if blocked:
+                between = [(row + step[0], col + step[1]) for step in blocked]
+            elif piece.get_type() in ('chariot', 'cannon'):
+                distance = max(abs(move[0]), abs(move[1]))
+                step = (move[0] // distance, move[1] // distance) \
+                    if distance else (0, 0)
+                between = [(row + step[0] * num, col + step[1] * num)
+                           for num in range(1, distance)]
+            else:
+                between = []
+            moves[end[0] * 9 + end[1]] = tuple(between)
+        table.append(moves)
+    return table
+
+
+MOVE_TABLES = {}
+for _piece in CODE_PIECES:
+    if _piece is None:
+        continue
+    if _piece.get_type() != 'soldier' and _piece.get_team() == 'blue':
+        # Only soldiers move differently for each team, share the rest
+        MOVE_TABLES['blue', _piece.get_type()] = \
+            MOVE_TABLES['red', _piece.get_type()]
+    else:
+        MOVE_TABLES[_piece.get_team(), _piece.get_type()] = \
+            build_move_table(_piece)
+
+# The squares between any two squares some piece can move between:
+# BETWEEN[origin][target] is the tuple MOVE_TABLES holds for that move.
+BETWEEN = [{} for _index in range(90)]
+for _table in MOVE_TABLES.values():
+    for _origin, _moves in enumerate(_table):
+        BETWEEN[_origin].update(_moves)
+
+# The horse and elephant origins whose moves each square can block:
+# BLOCKERS[index] is a tuple of origin indices.
+BLOCKERS = [set() for _index in range(90)]
+for _type in ('horse', 'elephant'):
+    for _origin, _moves in enumerate(MOVE_TABLES['red', _type]):
+        for _between in _moves.values():
+            for _row, _col in _between:
+                BLOCKERS[_row * 9 + _col].add(_origin)
+BLOCKERS = [tuple(sorted(_origins)) for _origins in BLOCKERS]
+
+# Attack counts and targets of an empty square, see JanggiGame.
+NO_ATTACKS = (None, ())
+# Pieces whose attacks other squares can change: chariots and cannons along
+# their lines, and horses and elephants through their blocking squares.
+CHARIOT_PIECES = frozenset(_piece for _piece in CODE_PIECES
+                           if _piece is not None and
+                           _piece.get_type() == 'chariot')
+CANNON_PIECES = frozenset(CODE_PIECES[_code] for _code in CANNON_CODES)
+BLOCKABLE_PIECES = frozenset(_piece for _piece in CODE_PIECES
+                             if _piece is not None and
+                             _piece.get_type() in ('horse', 'elephant'))
+
+# The squares each square can be reached from: ATTACK_TABLES[team, type]
+# [target] is a tuple of origin indices.
+ATTACK_TABLES = {}
+for (_team, _type), _table in MOVE_TABLES.items():
+    _sources = [[] for _index in range(90)]
+    for _origin, _moves in enumerate(_table):
+        for _target in _moves:
+            if _target != _origin:
+                _sources[_target].append(_origin)
+    ATTACK_TABLES[_team, _type] = [tuple(_origins) for _origins in _sources]
+
+# 64-bit Zobrist keys: ZOBRIST_KEYS[code][index] for a piece code on a square
+# (all zero for empty squares), and ZOBRIST_BLUE_TURN when Blue is to move.
+# The seed is fixed so that hashes agree between processes and runs.
+_zobrist_random = random.Random(20210310)
+ZOBRIST_KEYS = [[0] * 90 if CODE_PIECES[_code] is None else
+                [_zobrist_random.getrandbits(64) for _index in range(90)]
+                for _code in range(16)]
+ZOBRIST_BLUE_TURN = _zobrist_random.getrandbits(64)
+
+# Evaluation score of each piece code on each square, see evaluation.py:
+# SQUARE_SCORES[code][index], positive for Red.
+SQUARE_SCORES = [(0,) * 90 if CODE_PIECES[_code] is None else
+                 square_scores(CODE_PIECES[_code].get_team(),
+                               CODE_PIECES[_code].get_type())
+                 for _code in range(16)]
+
+# [y, x] square of each index, as a tuple so that it can be handed out to
+# callers and shared by the move generator without being copied.
+SQUARES = [(_row, _col) for _row in range(10) for _col in range(9)]
+
+# Algebraic notation of each index, such as 'a1' for [0, 0] and 'i10' for
+# [9, 8], and the index of each notation.
+SQUARE_NAMES = ['abcdefghi'[_col] + str(_row + 1) for _row, _col in SQUARES]
+SQUARE_INDEX = {_name: _index for _index, _name in enumerate(SQUARE_NAMES)}
+
+
+def parse_moves(text):
+    """
+    Parses a list of moves written as start and end notation run together
+    and separated by spaces, such as 'b3b10 a7a6'.
+    :param text: String of moves.
+    :return: List of (start, end) [y, x] square pairs from SQUARES.
+    """
+    moves = []
+    for move in text.split():
+        split = 2 if move[2:3].isalpha() else 3
+        start = SQUARE_INDEX.get(move[:split])
+        end = SQUARE_INDEX.get(move[split:])
+        if start is None or end is None:
+            raise ValueError('bad move %r' % move)
+        moves.append((SQUARES[start], SQUARES[end]))
+    return moves
+
+
+# Square indices walked outward from each index: up, down, left and right.
+RAYS = []
+for _row, _col in SQUARES:
+    RAYS.append((tuple(_num * 9 + _col for _num in range(_row - 1, -1, -1)),
+                 tuple(_num * 9 + _col for _num in range(_row + 1, 10)),
+                 tuple(_row * 9 + _num for _num in range(_col - 1, -1, -1)),
+                 tuple(_row * 9 + _num for _num in range(_col + 1, 9))))
+
+
+class ListBoard:
+    """Stores the board as a 10x9 list of lists holding Piece objects."""
+    
+    def __init__(self, cells=None):
+        """
+        Initializes an empty board, or one filled from piece codes.
+        :param cells: Optional sequence of 90 piece codes, row by row.
+        """
+        self._rows = [[None] * 9 for _ in range(10)]
+        if cells is not None:
+            for index, code in enumerate(cells):
+                self._rows[index // 9][index % 9] = CODE_PIECES[code]
+    
+    def get_piece(self, square):
+        """Returns the Piece at a [y, x] square, or None."""
+        return self._rows[square[0]][square[1]]
+    
+    def set_piece(self, square, piece):
+        """Places a Piece, or None, at a [y, x] square."""
+        self._rows[square[0]][square[1]] = piece
+    
+    def get_rows(self):
+        """Returns the board as a list of rows of Pieces."""
+        return self._rows
+    
+    def set_rows(self, rows):
+        """Replaces the board with a list of rows of Pieces."""
+        self._rows = rows
+    
+    def get_pieces(self):
+        """Yields the [y, x] square and Piece of every occupied square."""
+        for row_count, row in enumerate(self._rows):
+            for col_count, piece in enumerate(row):
+                if piece is not None:
+                    yield SQUARES[row_count * 9 + col_count], piece
+    
+    def count_between(self, origin, target):
+        """Counts the pieces on the squares between two square indices."""
+        count = 0
+        for row, col in BETWEEN[origin][target]:
+            if self._rows[row][col] is not None:
+                count += 1
+        return count
+    
+    def count_cannons_between(self, origin, target):
+        """Counts the cannons on the squares between two square indices."""
+        count = 0
+        for row, col in BETWEEN[origin][target]:
+            piece = self._rows[row][col]
+            if piece is not None and piece.get_type() == 'cannon':
+                count += 1
+        return count
+    
+    def to_bytes(self):
+        """Returns the board as 90 piece codes, row by row."""
+        return bytes(piece_code(piece) for row in self._rows for piece in row)
+    
+    def copy(self):
+        """Returns an independent copy of the board."""
+        board = ListBoard()
+        board.set_rows([list(row) for row in self._rows])
+        return board
+
+
+class ArrayBoard:
+    """Stores the board as a flat bytearray of 90 piece codes, row by row.
+    Pieces are handed out as shared instances from CODE_PIECES."""
+    
+    def __init__(self, cells=None):
+        """
+        Initializes an empty board, or one filled from piece codes.
+        :param cells: Optional sequence of 90 piece codes, row by row.
+        """
+        self._cells = bytearray(90) if cells is None else bytearray(cells)
+    
+    def get_piece(self, square):
+        """Returns the Piece at a [y, x] square, or None."""
+        return CODE_PIECES[self._cells[square[0] * 9 + square[1]]]
+    
+    def set_piece(self, square, piece):
+        """Places a Piece, or None, at a [y, x] square."""
+        self._cells[square[0] * 9 + square[1]] = piece_code(piece)
+    
+    def get_rows(self):
+        """Returns a list of rows of Pieces built from the codes. Changing
+        the rows does not change the board."""
+        cells = self._cells
+        return [[CODE_PIECES[code] for code in cells[row:row + 9]]
+                for row in range(0, 90, 9)]
+    
+    def set_rows(self, rows):
+        """Replaces the board with a list of rows of Pieces."""
+        self._cells = bytearray(piece_code(piece) for row in rows
+                                for piece in row)
+    
+    def get_pieces(self):
+        """Yields the [y, x] square and Piece of every occupied square."""
+        for index, code in enumerate(self._cells):
+            if code:
+                yield SQUARES[index], CODE_PIECES[code]
+    
+    def count_between(self, origin, target):
+        """Counts the pieces on the squares between two square indices."""
+        count = 0
+        for row, col in BETWEEN[origin][target]:
+            if self._cells[row * 9 + col]:
+                count += 1
+        return count
+    
+    def count_cannons_between(self, origin, target):
+        """Counts the cannons on the squares between two square indices."""
+        count = 0
+        for row, col in BETWEEN[origin][target]:
+            if self._cells[row * 9 + col] in CANNON_CODES:
+                count += 1
+        return count
+    
+    def to_bytes(self):
+        """Returns the board as 90 piece codes, row by row."""
+        return bytes(self._cells)
+    
+    def copy(self):
+        """Returns an independent copy of the board."""
+        return ArrayBoard(self._cells)
+
+
+class MoveRecord:
+    """Records the squares and pieces changed by a move, so that the move
+    can be taken back without copying the board."""
+    
+    def __init__(self, piece, captured, start, end, general_square,
+                 red_in_check, blue_in_check, attack_changes=()):
+        """
+        Initializes the parameters needed to undo a move.
+        :param piece: The Piece that was moved.
+        :param captured: The Piece that was on the end square, or None.
+        :param start: The square moved from.
+        :param end: The square moved to.
+        :param general_square: The moving team's general square before the
+        move.
+        :param red_in_check: Red's check flag before the move.
+        :param blue_in_check: Blue's check flag before the move.
+        :param attack_changes: List of (square index, attacks) the move
+        replaced, filled in by JanggiGame.apply_move().
+        """
+        self._piece = piece
+        self._captured = captured
+        self._start = start
+        self._end = end
+        self._general_square = general_square
+        self._red_in_check = red_in_check
+        self._blue_in_check = blue_in_check
+        self._attack_changes = attack_changes
+    
+    def get_piece(self):
+        """Returns the Piece that was moved."""
+        return self._piece
+    
+    def get_captured(self):
+        """Returns the Piece that was captured, or None."""
+        return self._captured
+    
+    def get_start(self):
+        """Returns the square the Piece moved from."""
+        return self._start
+    
+    def get_end(self):
+        """Returns the square the Piece moved to."""
+        return self._end
+    
+    def get_general_square(self):
+        """Returns the moving team's general square before the move."""
+        return self._general_square
+    
+    def get_checks(self):
+        """Returns the red and blue check flags before the move."""
+        return self._red_in_check, self._blue_in_check
+    
+    def get_attack_changes(self):
+        """Returns the attacks of each square the move replaced, oldest
+        first."""
+        return self._attack_changes
+
+
+class MateCache:
+    """A bounded cache of checkmate_checker() verdicts keyed by position
+    hash. One cache can be shared by many games; the least recently used
+    verdict is dropped when the cache is full."""
+    
+    def __init__(self, max_size=65536):
+        """
+        Initializes an empty cache.
+        :param max_size: Most verdicts to keep.
+        """
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+    
+    def lookup(self, key):
+        """
+        Returns the verdict stored for a position, counting a hit or miss.
+        :param key: Position key.
+        :return: True if the team in check can escape, False if it is
+        checkmated, None if the position is not cached.
+        """
+        verdict = self._entries.get(key)
+        if verdict is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        self._entries.move_to_end(key)
+        return verdict
+    
+    def store(self, key, verdict):
+        """Stores the verdict for a position, dropping the least recently
+        used one if the cache is full."""
+        self._entries[key] = verdict
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+    
+    def get_hits(self):
+        """Returns the number of lookups that found a verdict."""
+        return self._hits
+    
+    def get_misses(self):
+        """Returns the number of lookups that found nothing."""
+        return self._misses
+    
+    def get_stats(self):
+        """Returns the size and hit counters as a dict."""
+        return {'size': len(self._entries), 'max_size': self._max_size,
+                'hits': self._hits, 'misses': self._misses}
+    
+    def clear(self):
+        """Empties the cache and resets its counters."""
+        self._entries.clear()
+        self._hits = 0
+        self._misses = 0
+
+
 class JanggiGame:
     """
     Represents the board game Janggi.
@@ -128,65 +559,65 @@ class JanggiGame:
     
     # To Do:
     
-    def __init__(self):
+    def __init__(self, board_class=ListBoard, mate_cache=None, setup=True):
         """
         Initializes the parameters for a game of Janggi, including:
             Playing board and palace
             Initial turn and game state
             Playing pieces
+        :param board_class: The board storage to play on, ListBoard or
+        ArrayBoard.
+        :param mate_cache: Optional MateCache for checkmate_checker().
+        :param setup: False to leave the board empty, for callers such as
+        from_fen() that place every piece themselves.
         """
-        self._board = [[None, None, None, None, None, None, None, None, None],
-                       [None, None, None, None, None, None, None, None, None],
-                       [None, None, None, None, None, None, None, None, None],
-                       [None, None, None, None, None, None, None, None, None],
-                       [None, None, None, None, None, None, None, None, None],
-                       [None, None, None, None, None, None, None, None, None],
-                       [None, None, None, None, None, None, None, None, None],
-                       [None, None, None, None, None, None, None, None, None],
-                       [None, None, None, None, None, None, None, None, None],
-                       [None, None, None, None, None, None, None, None, None]]
-        self._palace = [[0, 3], [0, 4], [0, 5], [1, 3], [1, 4], [1, 5], [2, 3],
-                        [2, 4], [2, 5], [7, 3], [7, 4], [7, 5], [8, 3], [8, 4],
-                        [8, 5], [9, 3], [9, 4], [9, 5]]
+        self._board = board_class()
+        self._palace = PALACE
+        self._mate_cache = mate_cache
         self._game_state = "UNFINISHED"
         self._current_turn = "blue"
+        self._hash = ZOBRIST_BLUE_TURN  # Updated by set_board() below
+        self._score = 0  # Also updated by set_board()
+        self._attacks = None  # Attack maps, built by get_attacks()
         self._red_in_check = False
         self._blue_in_check = False
-        self._red_general_square = [1, 4]
-        self._blue_general_square = [8, 4]
+        self._red_general_square = SQUARES[1 * 9 + 4]
+        self._blue_general_square = SQUARES[8 * 9 + 4]
+        if not setup:
+            return
         # Set pieces on board
-        self._board[1][4] = Piece('red', 'general', 'G')
-        self._board[0][0] = Piece('red', 'chariot', 'C')
-        self._board[0][8] = Piece('red', 'chariot', 'C')
-        self._board[0][1] = Piece('red', 'elephant', 'E')
-        self._board[0][6] = Piece('red', 'elephant', 'E')
-        self._board[0][2] = Piece('red', 'horse', 'H')
-        self._board[0][7] = Piece('red', 'horse', 'H')
-        self._board[0][3] = Piece('red', 'guard', 'U')
-        self._board[0][5] = Piece('red', 'guard', 'U')
-        self._board[2][1] = Piece('red', 'cannon', 'N')
-        self._board[2][7] = Piece('red', 'cannon', 'N')
-        self._board[3][0] = Piece('red', 'soldier', 'S')
-        self._board[3][2] = Piece('red', 'soldier', 'S')
-        self._board[3][4] = Piece('red', 'soldier', 'S')
-        self._board[3][6] = Piece('red', 'soldier', 'S')
-        self._board[3][8] = Piece('red', 'soldier', 'S')
-        self._board[8][4] = Piece('blue', 'general', 'g')
-        self._board[9][1] = Piece('blue', 'elephant', 'e')
-        self._board[9][6] = Piece('blue', 'elephant', 'e')
-        self._board[9][2] = Piece('blue', 'horse', 'h')
-        self._board[9][7] = Piece('blue', 'horse', 'h')
-        self._board[9][0] = Piece('blue', 'chariot', 'c')
-        self._board[9][8] = Piece('blue', 'chariot', 'c')
-        self._board[9][3] = Piece('blue', 'guard', 'u')
-        self._board[9][5] = Piece('blue', 'guard', 'u')
-        self._board[7][1] = Piece('blue', 'cannon', 'n')
-        self._board[7][7] = Piece('blue', 'cannon', 'n')
-        self._board[6][0] = Piece('blue', 'soldier', 's')
-        self._board[6][2] = Piece('blue', 'soldier', 's')
-        self._board[6][4] = Piece('blue', 'soldier', 's')
-        self._board[6][6] = Piece('blue', 'soldier', 's')
-        self._board[6][8] = Piece('blue', 'soldier', 's')
+        self.set_board(Piece('red', 'general', 'G'), [1, 4])
+        self.set_board(Piece('red', 'chariot', 'C'), [0, 0])
+        self.set_board(Piece('red', 'chariot', 'C'), [0, 8])
+        self.set_board(Piece('red', 'elephant', 'E'), [0, 1])
+        self.set_board(Piece('red', 'elephant', 'E'), [0, 6])
+        self.set_board(Piece('red', 'horse', 'H'), [0, 2])
+        self.set_board(Piece('red', 'horse', 'H'), [0, 7])
+        self.set_board(Piece('red', 'guard', 'U'), [0, 3])
+        self.set_board(Piece('red', 'guard', 'U'), [0, 5])
+        self.set_board(Piece('red', 'cannon', 'N'), [2, 1])
+        self.set_board(Piece('red', 'cannon', 'N'), [2, 7])
+        self.set_board(Piece('red', 'soldier', 'S'), [3, 0])
+        self.set_board(Piece('red', 'soldier', 'S'), [3, 2])
+        self.set_board(Piece('red', 'soldier', 'S'), [3, 4])
+        self.set_board(Piece('red', 'soldier', 'S'), [3, 6])
+        self.set_board(Piece('red', 'soldier', 'S'), [3, 8])
+        self.set_board(Piece('blue', 'general', 'g'), [8, 4])
+        self.set_board(Piece('blue', 'elephant', 'e'), [9, 1])
+        self.set_board(Piece('blue', 'elephant', 'e'), [9, 6])
+        self.set_board(Piece('blue', 'horse', 'h'), [9, 2])
+        self.set_board(Piece('blue', 'horse', 'h'), [9, 7])
+        self.set_board(Piece('blue', 'chariot', 'c'), [9, 0])
+        self.set_board(Piece('blue', 'chariot', 'c'), [9, 8])
+        self.set_board(Piece('blue', 'guard', 'u'), [9, 3])
+        self.set_board(Piece('blue', 'guard', 'u'), [9, 5])
+        self.set_board(Piece('blue', 'cannon', 'n'), [7, 1])
+        self.set_board(Piece('blue', 'cannon', 'n'), [7, 7])
+        self.set_board(Piece('blue', 'soldier', 's'), [6, 0])
+        self.set_board(Piece('blue', 'soldier', 's'), [6, 2])
+        self.set_board(Piece('blue', 'soldier', 's'), [6, 4])
+        self.set_board(Piece('blue', 'soldier', 's'), [6, 6])
+        self.set_board(Piece('blue', 'soldier', 's'), [6, 8])
     
     def set_red_in_check(self, flag):
         """When invoked, changes the red_in_check flag to its opposite."""
@@ -209,46 +640,343 @@ class JanggiGame:
             return self._blue_general_square
     
     def set_general_square(self, team, square):
-        """Sets and tracks the square the generals are at."""
+        """Sets and tracks the square the generals are at, kept as the
+        SQUARES entry of the square."""
         if team == "red":
-            self._red_general_square = square
+            self._red_general_square = SQUARES[square[0] * 9 + square[1]]
         else:
-            self._blue_general_square = square
+            self._blue_general_square = SQUARES[square[0] * 9 + square[1]]
     
     def convert_algebraic_notation(self, notation):
         """
         Takes the algebraic notation used to specify squares for make_move()
-        and other functions and splits it into separate alpha-numeric values
-        for accessing dictionary key-values and list indices.
+        and other functions and converts it to a [y, x] square.
         :param notation: A string in algebraic notation consisting of one
-        letter from a-h and one number from 1-10.
-        :return: Array.
-        """
-        cipher = {
-            'a': 0, 'b': 1, 'c': 2, 'd': 3, 'e': 4, 'f': 5, 'g': 6, 'h': 7,
-            'i': 8, '1': 0, '2': 1, '3': 2, '4': 3, '5': 4, '6': 5, '7': 6,
-            '8': 7, '9': 8, '0': 9
-        }
-        coordinates = []
-        for char in notation:
-            coordinates.append(cipher[char])
-        if len(coordinates) == 3:
-            coordinates.remove(coordinates[1])
-        # Reverses dimensions to [y, x] format, due to how board is stored.
-        coordinates[0], coordinates[1] = coordinates[1], coordinates[0]
-        return coordinates
+        letter from a-i and one number from 1-10.
+        :return: Tuple from SQUARES.
+        """
+        return SQUARES[SQUARE_INDEX[notation]]
+    
+    def convert_to_algebraic_notation(self, square):
+        """
+        Converts a [y, x] square back to the algebraic notation used by
+        make_move(), the reverse of convert_algebraic_notation().
+        :param square: The [y, x] square.
+        :return: String.
+        """
+        return SQUARE_NAMES[square[0] * 9 + square[1]]
     
     def get_board(self):
-        """Returns the current state of the board."""
-        return self._board
+        """Returns the current state of the board as a list of rows."""
+        return self._board.get_rows()
     
-    def set_board(self, piece, square):
-        """Sets or moves a specific piece to the designated square."""
-        self._board[square[0]][square[1]] = piece
+    def set_board(self, piece, square, attacks=True):
+        """Sets or moves a specific piece to the designated square, updating
+        the position hash, evaluation score and, if they are kept and
+        attacks is not False, the attack counts."""
+        index = square[0] * 9 + square[1]
+        old_code = piece_code(self.get_piece(square))
+        code = piece_code(piece)
+        self._hash ^= ZOBRIST_KEYS[old_code][index] ^ ZOBRIST_KEYS[code][index]
+        self._score += SQUARE_SCORES[code][index] - \
+            SQUARE_SCORES[old_code][index]
+        self._board.set_piece(square, piece)
+        if self._attacks is not None:
+            self._cells[index] = piece
+            if attacks:
+                self.update_attacks((index,))
         
     def set_whole_board(self, board):
-        """Replaces the entire board with the version provided."""
-        self._board = board
+        """Replaces the entire board with the list of rows provided."""
+        self._board.set_rows(board)
+        self._hash = self.compute_hash()
+        self._score = self.compute_score()
+        if self._attacks is not None:
+            self.reset_attacks()
+    
+    def get_hash(self):
+        """Returns the 64-bit Zobrist hash of the piece placement and the
+        current turn, kept up to date as the board changes."""
+        return self._hash
+    
+    def compute_hash(self):
+        """Computes the Zobrist hash of the position from scratch."""
+        value = ZOBRIST_BLUE_TURN if self.get_current_turn() == 'blue' else 0
+        for square, piece in self._board.get_pieces():
+            value ^= ZOBRIST_KEYS[piece_code(piece)][square[0] * 9 + square[1]]
+        return value
+    
+    def get_score(self):
+        """Returns the evaluation score of the position for Red, kept up to
+        date as the board changes. See evaluation.py."""
+        return self._score
+    
+    def compute_score(self):
+        """Computes the evaluation score for Red from scratch."""
+        score = 0
+        for square, piece in self._board.get_pieces():
+            index = square[0] * 9 + square[1]
+            score += SQUARE_SCORES[piece_code(piece)][index]
+        return score
+    
+    def evaluate(self):
+        """Returns the evaluation score for the team of the current turn."""
+        return self._score if self._current_turn == 'red' else -self._score
+    
+    def get_pieces(self):
+        """Yields the [y, x] square and Piece of every occupied square."""
+        return self._board.get_pieces()
+    
+    def get_position(self):
+        """Returns the board as 90 piece codes, row by row."""
+        return self._board.to_bytes()
+    
+    def set_position(self, cells):
+        """
+        Replaces the board with piece codes, as returned by get_position(),
+        and finds the squares of the generals, the hash and the score.
+        :param cells: Sequence of 90 piece codes, row by row, with one
+        general of each team.
+        :return: None.
+        """
+        cells = bytes(cells)
+        if cells.count(PIECE_CODES['red', 'general']) != 1 or \
+                cells.count(PIECE_CODES['blue', 'general']) != 1:
+            raise ValueError('position without one general each')
+        self._board = type(self._board)(cells)
+        for square, piece in self.get_pieces():
+            if piece.get_type() == 'general':
+                self.set_general_square(piece.get_team(), square)
+        self._hash = self.compute_hash()
+        self._score = self.compute_score()
+        if self._attacks is not None:
+            self.reset_attacks()
+    
+    def get_attacks(self, team):
+        """
+        Returns how many of a team's pieces attack each square: could
+        capture an enemy piece standing there, whether or not one does. The
+        counts are built on the first call and from then on kept up to date
+        as the board changes, which slows down moves, so games that never
+        ask for them do not pay for them.
+        :param team: String, 'red' or 'blue'.
+        :return: List of 90 counts indexed by y * 9 + x. Do not modify.
+        """
+        if self._attacks is None:
+            self.reset_attacks()
+        return self._attacks[team]
+    
+    def count_attackers(self, team, square):
+        """Returns how many of a team's pieces attack a [y, x] square."""
+        return self.get_attacks(team)[square[0] * 9 + square[1]]
+    
+    def attack_targets(self, origin):
+        """
+        Lists the squares the piece on a square attacks, by the move rules
+        of pseudo_legal_moves(). Squares of the piece's own team are
+        included, and a cannon does not attack cannons.
+        :param origin: Square index, y * 9 + x.
+        :return: Tuple of square indices.
+        """
+        cells = self._cells
+        piece = cells[origin]
+        if piece is None:
+            return ()
+        piece_type = piece.get_type()
+        table = MOVE_TABLES[piece.get_team(), piece_type][origin]
+        targets = []
+        if piece_type == 'chariot':
+            for ray in RAYS[origin]:
+                for index in ray:
+                    if index in table:
+                        targets.append(index)
+                    if cells[index] is not None:
+                        break  # Chariot stops at the first piece
+        elif piece_type == 'cannon':
+            for ray in RAYS[origin]:
+                screen = False
+                for index in ray:
+                    target = cells[index]
+                    if not screen:
+                        if target is not None:
+                            if target.get_type() == 'cannon':
+                                break  # Cannons cannot jump cannons
+                            screen = True
+                        continue
+                    if target is None:
+                        if index in table:
+                            targets.append(index)
+                        continue
+                    if index in table and target.get_type() != 'cannon':
+                        targets.append(index)
+                    break  # Cannon stops at the first piece past screen
+        else:
+            for index, between in table.items():
+                if index == origin:
+                    continue  # Passing move
+                for row, col in between:
+                    if cells[row * 9 + col] is not None:
+                        break  # Horse or elephant blocked
+                else:
+                    targets.append(index)
+        return tuple(targets)
+    
+    def refresh_attacks(self, origin):
+        """Replaces the attacks counted for a square's piece with those it
+        makes from the current board."""
+        counts, targets = self._attack_sets[origin]
+        if self._attack_log is not None:
+            self._attack_log.append((origin, (counts, targets)))
+        for index in targets:
+            counts[index] -= 1
+        piece = self._cells[origin]
+        if piece is None:
+            self._attack_sets[origin] = NO_ATTACKS
+            return
+        counts = self._attacks[piece.get_team()]
+        targets = self.attack_targets(origin)
+        for index in targets:
+            counts[index] += 1
+        self._attack_sets[origin] = (counts, targets)
+    
+    def update_attacks(self, indices):
+        """
+        Updates the attack counts after squares changed. Only the pieces on
+        the squares and the pieces whose moves pass through them can attack
+        differently: the first piece along each line from a square if it is
+        a chariot or cannon, the second if it is a cannon, and horses and
+        elephants a square blocks.
+        :param indices: Tuple of the indices of the changed squares.
+        :return: None.
+        """
+        cells = self._cells
+        origins = list(indices)
+        for index in indices:
+            for ray in RAYS[index]:
+                found = 0
+                for origin in ray:
+                    piece = cells[origin]
+                    if piece is None:
+                        continue
+                    found += 1
+                    if (piece in CANNON_PIECES or found == 1 and
+                            piece in CHARIOT_PIECES) and \
+                            origin not in origins:
+                        origins.append(origin)
+                    if found == 2:
+                        break
+            for origin in BLOCKERS[index]:
+                if cells[origin] in BLOCKABLE_PIECES and \
+                        origin not in origins:
+                    origins.append(origin)
+        for origin in origins:
+            self.refresh_attacks(origin)
+    
+    def restore_attacks(self, changes):
+        """
+        Puts back the attacks a move replaced, so that taking a move back
+        does not recompute them.
+        :param changes: List returned by MoveRecord.get_attack_changes().
+        :return: None.
+        """
+        attack_sets = self._attack_sets
+        for origin, entry in reversed(changes):
+            counts, targets = attack_sets[origin]
+            for index in targets:
+                counts[index] -= 1
+            counts, targets = entry
+            for index in targets:
+                counts[index] += 1
+            attack_sets[origin] = entry
+    
+    def reset_attacks(self):
+        """Counts the attacks of every piece from scratch, when the maps are
+        first asked for or after the whole board was replaced."""
+        # Each team's attack counts on every square, the (counts, targets)
+        # of the piece on each square, and the Piece on each square, kept up
+        # to date by set_board(). See update_attacks().
+        self._attacks = {'red': [0] * 90, 'blue': [0] * 90}
+        self._attack_sets = [NO_ATTACKS] * 90
+        self._cells = [None] * 90
+        self._attack_log = None  # List recording replaced attacks, or None
+        for square, piece in self.get_pieces():
+            self._cells[square[0] * 9 + square[1]] = piece
+        for index in range(90):
+            self.refresh_attacks(index)
+    
+    def to_fen(self):
+        """
+        Describes the position as a string of three fields separated by
+        spaces: the rows from row 1 to row 10 separated by '/', with piece
+        images for pieces and digits for runs of empty squares; the team to
+        move, 'r' or 'b'; and the teams in check, or '-' for neither.
+        :return: String, for example START_FEN for the starting setup.
+        """
+        rows = []
+        cells = self.get_position()
+        for row in range(0, 90, 9):
+            text = ''
+            empty = 0
+            for code in cells[row:row + 9]:
+                if code:
+                    if empty:
+                        text += str(empty)
+                        empty = 0
+                    text += CODE_PIECES[code].get_image()
+                else:
+                    empty += 1
+            rows.append(text + str(empty) if empty else text)
+        checks = ('r' if self._red_in_check else '') + \
+            ('b' if self._blue_in_check else '')
+        return '%s %s %s' % ('/'.join(rows), self.get_current_turn()[0],
+                             checks or '-')
+    
+    def load_fen(self, fen):
+        """
+        Replaces the position with one described by to_fen(), including the
+        general squares, turn and check flags. The game is unfinished.
+        :param fen: String in the format of to_fen().
+        :return: None.
+        """
+        fields = fen.split()
+        if len(fields) != 3 or fields[1] not in FEN_TEAMS or \
+                fields[2] not in ('-', 'r', 'b', 'rb'):
+            raise ValueError('bad position string: %r' % fen)
+        cells = bytearray()
+        rows = fields[0].split('/')
+        for text in rows:
+            length = len(cells)
+            for char in text:
+                if char in FEN_CODES:
+                    cells.append(FEN_CODES[char])
+                elif char in '123456789':
+                    cells.extend(bytes(int(char)))
+                else:
+                    raise ValueError('bad square %r in %r' % (char, fen))
+            if len(cells) - length != 9:
+                raise ValueError('row without 9 squares in %r' % fen)
+        if len(rows) != 10:
+            raise ValueError('position without 10 rows: %r' % fen)
+        if cells.count(PIECE_CODES['red', 'general']) != 1 or \
+                cells.count(PIECE_CODES['blue', 'general']) != 1:
+            raise ValueError('position without one general each: %r' % fen)
+        self._current_turn = FEN_TEAMS[fields[1]]
+        self.set_position(cells)
+        self.set_checks('r' in fields[2], 'b' in fields[2])
+        self._game_state = 'UNFINISHED'
+    
+    @classmethod
+    def from_fen(cls, fen, board_class=ListBoard, mate_cache=None):
+        """
+        Creates a game in the position described by to_fen().
+        :param fen: String in the format of to_fen().
+        :param board_class: The board storage to play on.
+        :param mate_cache: Optional MateCache for checkmate_checker().
+        :return: JanggiGame.
+        """
+        game = cls(board_class, mate_cache, setup=False)
+        game.load_fen(fen)
+        return game
     
     def get_current_turn(self):
         """Returns the team of the current turn."""
@@ -256,6 +984,8 @@ class JanggiGame:
     
     def set_current_turn(self, team):
         """Changes the current turn to the specified team."""
+        if team != self._current_turn:
+            self._hash ^= ZOBRIST_BLUE_TURN
         self._current_turn = team
     
     def get_palace(self):
@@ -295,9 +1025,7 @@ class JanggiGame:
     def get_piece(self, square):
         """ Gets a piece at a current square in [y, x] notation, returns None
         if no piece exists at that square."""
-        board = self.get_board()
-        piece = board[square[0]][square[1]]
-        return piece
+        return self._board.get_piece(square)
     
     def check_valid_turn(self, moving_piece):
         """Checks that the game is not finished, and that the correct player
@@ -317,35 +1045,20 @@ class JanggiGame:
         :param end: The square being moved to.
         :return: Bool.
         """
-        difference = [end[0] - start[0], end[1] - start[1]]
-        captured_piece = self.get_piece(end)
-        blocked = moving_piece.get_blocked(difference)
-        if difference not in moving_piece.get_moves():
-            return False  # Attempting invalid move
-        if moving_piece.get_palace_only() and end not in self.get_palace():
-            return False  # Attempting to move guard or general outside palace
-        if blocked:  # Check if piece can be and is blocked
-            if not self.check_blocked(blocked, start):
+        moves = MOVE_TABLES[moving_piece.get_team(), moving_piece.get_type()]
+        origin = start[0] * 9 + start[1]
+        target = end[0] * 9 + end[1]
+        if target not in moves[origin]:
+            return False  # Attempting invalid move or leaving the palace
+        if moving_piece.get_type() != 'cannon':  # Cannons jump, see below
+            if self._board.count_between(origin, target):
                 return False  # Piece blocked by another piece
-        if captured_piece is not None:
-            if captured_piece.get_team() == moving_piece.get_team() and \
-                    difference != [0, 0]:
+        captured_piece = self.get_piece(end)
+        if captured_piece is not None and start != end:
+            if captured_piece.get_team() == moving_piece.get_team():
                 return False  # Attempting to capture own piece
         return True
     
-    def check_blocked(self, blocked, start):
-        """
-        Checks if the Piece can be blocked.
-        :param blocked: The Piece's list of blocking squares.
-        :param start: The Piece's start square.
-        :return: Bool.
-        """
-        for move in blocked:
-            square = [start[0] + move[0], start[1] + move[1]]
-            if self.get_piece(square) is not None:  # Movement is blocked
-                return False
-        return True
-    
     def make_move(self, start, end):
         """
         Takes algebraic notation for a start and end square and checks if
@@ -362,24 +1075,15 @@ class JanggiGame:
         if moving_piece is None:
             return False  # No piece at start square
         player = moving_piece.get_team()
-        captured = None
         end = self.convert_algebraic_notation(end)
         piece_type = moving_piece.get_type()
         if not self.check_move(start, end, moving_piece, piece_type):
             return False
-        if start != end:  # Turn not being passed
-            captured = self.get_piece(end)
-            self.set_board(moving_piece, end)
-            self.set_board(None, start)  # Empties square Piece moved from
-            if piece_type == 'general':  # Set new location for General
-                self.set_general_square(self.get_current_turn(), end)
+        record = self.apply_move(start, end)
         # Determine if move puts other team in check, or if it's invalid
         check = self.test_checks()
         if check == 'invalid':  # Move was invalid, reset board
-            self.set_board(moving_piece, start)
-            self.set_board(captured, end)
-            if piece_type == 'general':  # Reset General's position
-                self.set_general_square(self.get_current_turn(), start)
+            self.unmake_move(record)
             return False
         elif check == 'red checks':  # Red has placed Blue in check
             self.set_checks(False, True)
@@ -390,6 +1094,53 @@ class JanggiGame:
         self.change_turn(player)
         return True
     
+    def apply_move(self, start, end):
+        """
+        Moves the piece at the start square to the end square without
+        validating the move, updating the general's square if needed.
+        :param start: The square being moved from.
+        :param end: The square being moved to.
+        :return: MoveRecord to pass to unmake_move().
+        """
+        moving_piece = self.get_piece(start)
+        team = moving_piece.get_team()
+        changes = [] if self._attacks is not None else ()
+        record = MoveRecord(moving_piece, self.get_piece(end), start, end,
+                            self.get_general_square(team),
+                            self._red_in_check, self._blue_in_check, changes)
+        if start != end:  # Turn not being passed
+            if self._attacks is None:
+                self.set_board(moving_piece, end)
+                self.set_board(None, start)  # Empties square moved from
+            else:
+                self.set_board(moving_piece, end, False)
+                self.set_board(None, start, False)
+                self._attack_log = changes  # For unmake_move() to put back
+                self.update_attacks((end[0] * 9 + end[1],
+                                     start[0] * 9 + start[1]))
+                self._attack_log = None
+            if moving_piece.get_type() == 'general':
+                self.set_general_square(team, end)
+        return record
+    
+    def unmake_move(self, record):
+        """
+        Restores the board to its state before the recorded move.
+        :param record: MoveRecord returned by apply_move().
+        :return: None.
+        """
+        moving_piece = record.get_piece()
+        start = record.get_start()
+        end = record.get_end()
+        if start != end:
+            self.set_board(record.get_captured(), end, False)
+            self.set_board(moving_piece, start, False)
+            if self._attacks is not None:
+                self.restore_attacks(record.get_attack_changes())
+        self.set_general_square(moving_piece.get_team(),
+                                record.get_general_square())
+        self.set_checks(*record.get_checks())
+    
     def change_turn(self, player):
         """
         Passes the turn to the next player, and invokes a test for checkmate
@@ -417,8 +1168,6 @@ class JanggiGame:
             return False  # Invalid move or wrong player moving
         if piece_type == 'cannon' and not self.move_cannon(start, end):
             return False  # Cannon attempting illegal move
-        if piece_type == 'chariot' and not self.move_chariot(start, end):
-            return False  # Chariot attempting illegal move
         return True
         
     def test_checks(self):
@@ -429,40 +1178,12 @@ class JanggiGame:
         :return: check: Possible values are 'blue_checks', 'red_checks',
         False, and 'invalid'.
         """
-        red_gen = self.get_general_square('red')
-        blue_gen = self.get_general_square('blue')
         turn = self.get_current_turn()
-        check = False
-        row_count = 0
-        for row in self.get_board():
-            col_count = 0
-            for col in row:
-                if col is not None:
-                    piece_team = col.get_team()
-                    start = [row_count, col_count]
-                    if turn == 'red':
-                        if piece_team == 'red':
-                            if self.test_move(start, blue_gen) is True:
-                                check = 'red checks'  # Red checks Blue
-                                return check
-                        else:
-                            if self.test_move(start, red_gen) is True:
-                                check = 'invalid'  # Red made illegal move
-                                return check
-                    else:
-                        if piece_team == 'blue':
-                            if self.test_move(start, red_gen) is True:
-                                check = 'blue checks'  # Blue checks Red
-                                return check
-                        else:
-                            if self.test_move(start, blue_gen) is True:
-                                check = 'invalid'  # Blue made illegal move
-                                return check
-                col_count += 1
-            row_count += 1
-        if not self.is_in_check(turn) and check is not False:
-            check = 'invalid'
-        return check
+        if self.is_general_attacked(turn):
+            return 'invalid'  # Move leaves own general in check
+        if self.is_general_attacked('red' if turn == 'blue' else 'blue'):
+            return turn + ' checks'  # Mover checks the other general
+        return False
     
     def test_move(self, start, end):
         """
@@ -477,30 +1198,6 @@ class JanggiGame:
         if moving_piece.get_type() == 'cannon' and \
                 not self.move_cannon(start, end):
             return False
-        if moving_piece.get_type() == 'chariot' and \
-                not self.move_chariot(start, end):
-            return False
-        return True
-    
-    def move_chariot(self, start, end):
-        """
-        Checks if a chariot is blocked by another piece.
-        :param start: The square being moved from.
-        :param end: The square being moved to.
-        :return: Bool.
-        """
-        if start[0] == end[0]:  # Chariot attempting horizontal movement
-            arr = [start[1], end[1]]
-            arr.sort()
-            for i in range(arr[0] + 1, arr[1] - 1):
-                if self.get_piece([start[0], i]) is not None:
-                    return False  # Piece between Chariot and destination
-        else:  # Chariot attempting vertical movement
-            arr = [start[0], end[0]]
-            arr.sort()
-            for i in range(arr[0] + 1, arr[1] - 1):
-                if self.get_piece([i, start[1]]) is not None:
-                    return False  # Piece between Chariot and destination
         return True
     
     def move_cannon(self, start, end):
@@ -512,132 +1209,254 @@ class JanggiGame:
         :param end: Square to be moved to.
         :return: Bool.
         """
-        if start[0] != end[0] and start[1] != end[1]:
-            return False  # Cannon attempting diagonal movement
         if start == end:
             return True  # Cannon used to pass turn
+        origin = start[0] * 9 + start[1]
+        target = end[0] * 9 + end[1]
+        if target not in MOVE_TABLES['red', 'cannon'][origin]:
+            return False  # Cannon attempting diagonal movement
         if self.get_piece(end) is not None:
             if self.get_piece(end).get_type() == 'cannon':
                 return False  # Cannon attempting to capture another cannon
-        if start[0] == end[0]:  # Test for valid horizontal movement
-            return self.move_cannon_horizon(start, end)
-        else:  # Test for valid vertical movement
-            return self.move_cannon_vert(start, end)
+        if self._board.count_cannons_between(origin, target):
+            return False  # Cannon attempting to jump another cannon
+        # Must be one piece in path
+        return self._board.count_between(origin, target) == 1
     
-    def move_cannon_horizon(self, start, end):
+    def get_mate_cache(self):
+        """Returns the MateCache used by checkmate_checker(), or None."""
+        return self._mate_cache
+    
+    def checkmate_checker(self, team):
         """
-        Counts the number of pieces between a cannon and it's
-        destination for horizontal movement, returning True if the move is
-        legal.
-        :param start: Square to be moved from.
-        :param end: Square to be moved to.
-        :return: Bool.
+        Checks board for a checkmate situation, using the mate cache if
+        the game has one.
+        :param team: The team currently in check.
+        :return: Bool, True if the team has a move out of check.
         """
-        count = 0
-        arr = [start[1], end[1]]
-        arr.sort()
-        for i in range(arr[0] + 1, arr[1]):
-            if self.get_piece([start[0], i]) is not None:
-                if self.get_piece([start[0], i]).get_type() == 'cannon':
-                    return False  # Cannon attempting to jump another cannon
-                count += 1
-        return True if count == 1 else False  # Must be one piece in path
+        cache = self._mate_cache
+        if cache is None:
+            verdict = self.has_legal_move(team)
+        else:
+            key = (self.get_hash(), team)
+            verdict = cache.lookup(key)
+            if verdict is None:
+                verdict = self.has_legal_move(team)
+                cache.store(key, verdict)
+        if verdict:
+            return True  # Valid move found, no checkmate
+        if team == 'red':
+            self.set_game_state('BLUE_WON')  # No valid moves found, Blue wins
+        else:
+            self.set_game_state('RED_WON')  # No valid moves found, Red wins
+        return False
+    
+    def has_legal_move(self, team):
+        """Returns True if the team has any legal move."""
+        for move in self.legal_moves(team):
+            return True
+        return False
     
-    def move_cannon_vert(self, start, end):
+    def legal_moves(self, team):
         """
-        Counts the number of pieces between a cannon and it's
-        destination for vertical movement, returning True if the move is
-        legal.
-        :param start: Square to be moved from.
-        :param end: Square to be moved to.
-        :return: Bool.
+        Yields every move the team can make without leaving its general in
+        check. Passing moves are not included.
+        :param team: The team to generate moves for.
+        :return: Generator of (start, end) pairs of [y, x] squares.
         """
-        count = 0
-        arr = [start[0], end[0]]
-        arr.sort()
-        for i in range(arr[0] + 1, arr[1]):
-            if self.get_piece([i, start[1]]) is not None:
-                if self.get_piece([i, start[1]]).get_type() == 'cannon':
-                    return False  # Cannon attempting to jump another cannon
-                count += 1
-        return True if count == 1 else False  # Must be one piece in path
+        for start, end in self.pseudo_legal_moves(team):
+            if self.test_check_break(start, end):
+                yield start, end
     
-    def checkmate_checker(self, team):
+    def perft(self, depth):
         """
-        Checks board for a checkmate situation.
-        :param team: The team currently in check.
-        :return: Bool.
+        Counts the move sequences of the given length from the current
+        position, with the players taking turns. Passing moves are not
+        counted. Used to verify and time move generation.
+        :param depth: Number of moves in each sequence.
+        :return: Int.
         """
-        rows = 0
-        for row in self.get_board():
-            cols = 0
-            for col in row:  # Search board for pieces to test
-                if col is not None:
-                    result = self.test_check_for_mate(col, team, rows, cols)
-                    if result is True:
-                        return True  # Valid move found, no checkmate
-                cols += 1
-            rows += 1
-        if team == 'red' and result is False:
-            self.set_game_state('BLUE_WON')  # No valid moves found, Blue wins
-        elif team == 'blue' and result is False:
-            self.set_game_state('RED_WON')  # No valid moves found, Red wins
-            
-    def test_check_for_mate(self, moving_piece, team, row, col):
+        if depth == 0:
+            return 1
+        team = self.get_current_turn()
+        nodes = 0
+        for start, end in self.legal_moves(team):
+            if depth == 1:
+                nodes += 1
+                continue
+            record = self.apply_move(start, end)
+            self.set_current_turn('red' if team == 'blue' else 'blue')
+            nodes += self.perft(depth - 1)
+            self.set_current_turn(team)
+            self.unmake_move(record)
+        return nodes
+    
+    def pseudo_legal_moves(self, team):
         """
-        Tests the current check to see if it is a checkmate.
-        :param moving_piece: Piece to be moved.
-        :param team: Team currently in check.
-        :param row: Row position of moving_piece's square.
-        :param col: Col position of moving_pieces's square.
-        :return: Bool.
+        Lists the moves the team's pieces can make by their movement rules,
+        without testing if the move leaves the team's general in check.
+        Chariots and cannons walk their rays; other pieces use MOVE_TABLES.
+        Passing moves are not included.
+        :param team: The team to generate moves for.
+        :return: List of (start, end) pairs of [y, x] squares.
         """
-        piece_team = moving_piece.get_team()
-        if piece_team == team:
-            start = [row, col]
-            for move in moving_piece.get_moves():  # Test all possible moves
-                end = [0, 0]
-                end[0] = move[0] + start[0]
-                end[1] = move[1] + start[1]
-                if (0 <= end[0] < 10) and (0 <= end[1] < 9) and start != end:
-                    result = self.test_check_break(start, end)
-                    if result is True:
-                        return True  # Possible move found, no checkmate
-        return False
+        moves = []
+        get_piece = self._board.get_piece
+        for start, piece in self._board.get_pieces():
+            if piece.get_team() != team:
+                continue
+            piece_type = piece.get_type()
+            origin = start[0] * 9 + start[1]
+            table = MOVE_TABLES[team, piece_type][origin]
+            if piece_type == 'chariot':
+                for ray in RAYS[origin]:
+                    for index in ray:
+                        target = get_piece(SQUARES[index])
+                        if index in table and (target is None or
+                                               target.get_team() != team):
+                            moves.append((start, SQUARES[index]))
+                        if target is not None:
+                            break  # Chariot stops at the first piece
+            elif piece_type == 'cannon':
+                for ray in RAYS[origin]:
+                    screen = False
+                    for index in ray:
+                        target = get_piece(SQUARES[index])
+                        if not screen:
+                            if target is not None:
+                                if target.get_type() == 'cannon':
+                                    break  # Cannons cannot jump cannons
+                                screen = True
+                            continue
+                        if target is None:
+                            if index in table:
+                                moves.append((start, SQUARES[index]))
+                            continue
+                        if index in table and target.get_team() != team \
+                                and target.get_type() != 'cannon':
+                            moves.append((start, SQUARES[index]))
+                        break  # Cannon stops at the first piece past screen
+            else:
+                for index in table:
+                    if index == origin:
+                        continue  # Passing move
+                    target = get_piece(SQUARES[index])
+                    if target is not None and target.get_team() == team:
+                        continue  # Cannot capture own piece
+                    if not self._board.count_between(origin, index):
+                        moves.append((start, SQUARES[index]))
+        return moves
+    
+    def capture_moves(self, team):
+        """
+        Lists only the moves of pseudo_legal_moves() that capture a piece,
+        without generating the quiet moves. Used by quiescence search.
+        :param team: The team to generate captures for.
+        :return: List of (start, end) pairs of [y, x] squares.
+        """
+        moves = []
+        get_piece = self._board.get_piece
+        for start, piece in self._board.get_pieces():
+            if piece.get_team() != team:
+                continue
+            piece_type = piece.get_type()
+            origin = start[0] * 9 + start[1]
+            table = MOVE_TABLES[team, piece_type][origin]
+            if piece_type == 'chariot':
+                for ray in RAYS[origin]:
+                    for index in ray:
+                        target = get_piece(SQUARES[index])
+                        if target is None:
+                            continue
+                        if index in table and target.get_team() != team:
+                            moves.append((start, SQUARES[index]))
+                        break  # Chariot stops at the first piece
+            elif piece_type == 'cannon':
+                for ray in RAYS[origin]:
+                    screen = False
+                    for index in ray:
+                        target = get_piece(SQUARES[index])
+                        if target is None:
+                            continue
+                        if not screen:
+                            if target.get_type() == 'cannon':
+                                break  # Cannons cannot jump cannons
+                            screen = True
+                            continue
+                        if index in table and target.get_team() != team \
+                                and target.get_type() != 'cannon':
+                            moves.append((start, SQUARES[index]))
+                        break  # Cannon stops at the first piece past screen
+            else:
+                for index in table:
+                    target = get_piece(SQUARES[index])
+                    if target is None or target.get_team() == team:
+                        continue  # Not a capture
+                    if not self._board.count_between(origin, index):
+                        moves.append((start, SQUARES[index]))
+        return moves
     
     def test_check_break(self, start, end):
         """
-        Tests if the proposed move can break check.
+        Tests if the proposed move leaves the moving team's general out of
+        check. The move must already be valid for the piece.
         :param start: Proposed square being moved from.
         :param end: Proposed square being moved to.
         :return: Bool.
         """
-        backup = deepcopy(self.get_board())
-        moving_piece = self.get_piece(start)
-        captured = None
-        piece_type = moving_piece.get_type()
-        if not self.check_move(start, end, moving_piece, piece_type):
-            return False
-        if start != end:
-            captured = self.get_piece(end)
-            self.set_board(moving_piece, end)
-            self.set_board(None, start)
-            if piece_type == 'general':
-                self.set_general_square(self.get_current_turn(), end)
-        check = self.test_checks()
-        if check == 'invalid':  # Move was invalid, reset board
-            self.set_board(moving_piece, start)
-            self.set_board(captured, end)
-            if piece_type == 'general':
-                self.set_general_square(self.get_current_turn(), start)
-            self.set_whole_board(backup)
-            return False
-        elif check == 'red checks' and self.is_in_check('red'):
-            self.set_whole_board(backup)
-            return False
-        elif check == 'blue checks' and self.is_in_check('blue'):
-            self.set_whole_board(backup)
-            return False
-        else:  # Neither side in check
-            self.set_whole_board(backup)
-            return True
+        team = self.get_piece(start).get_team()
+        record = self.apply_move(start, end)
+        attacked = self.is_general_attacked(team)
+        self.unmake_move(record)
+        return not attacked
+    
+    def is_general_attacked(self, team):
+        """
+        Checks if any piece of the other team could capture the team's
+        general on its next move. Works outward from the general: along its
+        lines for chariots and cannons, and through ATTACK_TABLES for the
+        squares other pieces could reach it from.
+        When the attack maps are kept, this is a lookup of the other team's
+        count on the general's square instead.
+        :param team: The team whose general is tested.
+        :return: Bool.
+        """
+        general = self.get_general_square(team)
+        target = general[0] * 9 + general[1]
+        enemy = 'blue' if team == 'red' else 'red'
+        if self._attacks is not None:
+            return self._attacks[enemy][target] > 0
+        get_piece = self._board.get_piece
+        for ray in RAYS[target]:
+            screen = False
+            for index in ray:
+                piece = get_piece(SQUARES[index])
+                if piece is None:
+                    continue
+                piece_type = piece.get_type()
+                if not screen:
+                    if piece_type == 'chariot' and piece.get_team() == enemy \
+                            and target in MOVE_TABLES[enemy, 'chariot'][index]:
+                        return True  # Chariot with a clear line
+                    if piece_type == 'cannon':
+                        break  # Cannons cannot act as a screen
+                    screen = True
+                    continue
+                if piece_type == 'cannon' and piece.get_team() == enemy \
+                        and target in MOVE_TABLES[enemy, 'cannon'][index]:
+                    return True  # Cannon over exactly one screen
+                break
+        for piece_type in ('horse', 'elephant', 'soldier', 'guard', 'general'):
+            for origin in ATTACK_TABLES[enemy, piece_type][target]:
+                piece = get_piece(SQUARES[origin])
+                if piece is not None and piece.get_type() == piece_type and \
+                        piece.get_team() == enemy and \
+                        not self._board.count_between(origin, target):
+                    return True
+        return False
+
+
+# Count and time the move pipeline for the whole process when JANGGI_PROFILE
+# is set. profiling.py turns itself on when it loads.
+if os.environ.get('JANGGI_PROFILE', '0') not in ('', '0'):
+    import profiling  # noqa: F401
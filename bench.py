@@ -0,0 +1,218 @@
+# Description: Benchmarks for the Janggi rules engine. Run from the command
+# line, for example:
+#     python bench.py perft 3
+#     python bench.py perft 3 bit    (board core: list, array or bit)
+#     python bench.py import
+#     python bench.py replay 4    (worker processes)
+#     python bench.py parallel 3 4    (search depth, worker processes)
+
+import os
+import subprocess
+import sys
+import time
+from Janggi import JanggiGame, ListBoard, ArrayBoard
+from bitboard import BitBoard
+from parallel_search import ParallelSearcher
+from replay import replay_games
+from search import Searcher
+
+# Fixed positions to benchmark, as the moves that reach them from the
+# starting setup in JanggiGame.__init__.
+POSITIONS = {
+    'start': [],
+    'opening': [('c7', 'c6'), ('c1', 'd3'), ('b10', 'd7'), ('b3', 'e3'),
+                ('c10', 'd8'), ('h1', 'g3')],
+    'midgame': [('c7', 'c6'), ('c1', 'd3'), ('b10', 'd7'), ('b3', 'e3'),
+                ('c10', 'd8'), ('h1', 'g3'), ('e7', 'e6'), ('e3', 'e6'),
+                ('h8', 'c8'), ('d3', 'e5'), ('c8', 'c4'), ('e5', 'c4'),
+                ('i10', 'i8'), ('g4', 'f4'), ('i8', 'f8'), ('g3', 'h5'),
+                ('h10', 'g8')],
+    'check': [('c7', 'c6'), ('c1', 'd3'), ('b10', 'd7'), ('b3', 'e3'),
+              ('c10', 'd8'), ('h1', 'g3'), ('e7', 'e6'), ('e3', 'e6'),
+              ('h8', 'c8'), ('d3', 'e5'), ('c8', 'c4'), ('e5', 'c4'),
+              ('i10', 'i8'), ('g4', 'f4'), ('i8', 'f8'), ('g3', 'h5'),
+              ('h10', 'g8'), ('e6', 'e3')],
+    'late': [('c7', 'c6'), ('c1', 'd3'), ('b10', 'd7'), ('b3', 'e3'),
+             ('c10', 'd8'), ('h1', 'g3'), ('e7', 'e6'), ('e3', 'e6'),
+             ('h8', 'c8'), ('d3', 'e5'), ('c8', 'c4'), ('e5', 'c4'),
+             ('i10', 'i8'), ('g4', 'f4'), ('i8', 'f8'), ('g3', 'h5'),
+             ('h10', 'g8'), ('e6', 'e3'), ('e9', 'd9'), ('c4', 'e5'),
+             ('c6', 'd6'), ('e5', 'c4'), ('a7', 'a6'), ('h3', 'h9'),
+             ('a10', 'a7'), ('c4', 'd6'), ('a6', 'b6'), ('h5', 'g7'),
+             ('b8', 'b1'), ('a1', 'b1'), ('a7', 'a4'), ('b1', 'c1')],
+}
+
+# Board cores that can be benchmarked, by name.
+BOARD_CLASSES = {'list': ListBoard, 'array': ArrayBoard, 'bit': BitBoard}
+
+# Node counts of JanggiGame.perft() for each position, by depth. A change
+# to move generation that alters one of these is a rules change.
+PERFT_RESULTS = {
+    'start': [1, 31, 961, 30971],
+    'opening': [1, 41, 1639, 61320],
+    'midgame': [1, 47, 1840, 81732],
+    'check': [1, 4, 182, 6597],
+    'late': [1, 32, 1460, 48149],
+}
+
+
+def setup_position(name, board_class=ListBoard):
+    """
+    Plays the moves of one of the POSITIONS from the starting setup.
+    :param name: Key into POSITIONS.
+    :param board_class: Board core for the game.
+    :return: JanggiGame.
+    """
+    game = JanggiGame(board_class)
+    for start, end in POSITIONS[name]:
+        if not game.make_move(start, end):
+            raise ValueError('illegal move %s %s in position %s'
+                             % (start, end, name))
+    return game
+
+
+def bench_perft(depth=3, board='list'):
+    """
+    Runs perft on every position and prints nodes and nodes per second.
+    :param depth: Perft depth.
+    :param board: Name of the board core in BOARD_CLASSES.
+    :return: Dict of position name to (nodes, seconds).
+    """
+    depth = int(depth)
+    results = {}
+    total_nodes = 0
+    total_time = 0.0
+    for name in POSITIONS:
+        game = setup_position(name, BOARD_CLASSES[board])
+        timer = time.perf_counter()
+        nodes = game.perft(depth)
+        seconds = time.perf_counter() - timer
+        results[name] = (nodes, seconds)
+        total_nodes += nodes
+        total_time += seconds
+        expected = PERFT_RESULTS.get(name, [])
+        status = ''
+        if depth < len(expected) and expected[depth] != nodes:
+            status = '  MISMATCH, expected %d' % expected[depth]
+        print('%-8s depth %d %10d nodes %8.3fs %10.0f nodes/s%s'
+              % (name, depth, nodes, seconds, nodes / seconds, status))
+    print('%-8s depth %d %10d nodes %8.3fs %10.0f nodes/s'
+          % ('total', depth, total_nodes, total_time,
+             total_nodes / total_time))
+    return results
+
+
+# Run in a fresh interpreter to time importing the rules engine.
+IMPORT_SCRIPT = ('import sys, time\n'
+                 'timer = time.perf_counter()\n'
+                 'import Janggi\n'
+                 'print(time.perf_counter() - timer, "pygame" in sys.modules)')
+
+
+def time_import():
+    """
+    Imports Janggi in a new Python process.
+    :return: Tuple of the import time in seconds and whether pygame was
+    imported along with it.
+    """
+    output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT],
+                            cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True,
+                            check=True).stdout.split()
+    return float(output[0]), output[1] == 'True'
+
+
+def bench_import(runs=10):
+    """
+    Times importing the rules engine in fresh processes and prints the
+    fastest and median times. Fails if the import pulls in pygame.
+    :param runs: Number of processes to start.
+    :return: List of import times in seconds.
+    """
+    times = []
+    for run in range(int(runs)):
+        seconds, pygame_loaded = time_import()
+        if pygame_loaded:
+            raise RuntimeError('importing Janggi imported pygame')
+        times.append(seconds)
+    times.sort()
+    print('import Janggi: best %.2fms, median %.2fms over %d runs'
+          % (times[0] * 1000, times[len(times) // 2] * 1000, len(times)))
+    return times
+
+
+def bench_replay(workers=None, games=2000):
+    """
+    Replays copies of every position's moves over a process pool and
+    prints games per second.
+    :param workers: Number of worker processes, by default one per CPU.
+    :param games: Number of games to replay.
+    :return: Seconds taken.
+    """
+    workers = None if workers is None else int(workers)
+    games = int(games)
+    move_lists = list(POSITIONS.values())
+    timer = time.perf_counter()
+    for result in replay_games((move_lists[number % len(move_lists)]
+                                for number in range(games)), workers):
+        if not result.is_valid():
+            raise ValueError('game %d was not replayed'
+                             % result.get_game_number())
+    seconds = time.perf_counter() - timer
+    print('replay: %d games %8.3fs %10.0f games/s with %s workers'
+          % (games, seconds, games / seconds,
+             'all CPU' if workers is None else workers))
+    return seconds
+
+
+def bench_parallel(depth=3, workers=None):
+    """
+    Searches each position to a fixed depth, once with Searcher and once
+    with ParallelSearcher, and prints the times and the speedup. Fails if
+    the two searches score a position differently.
+    :param depth: Depth to search.
+    :param workers: Number of worker processes, by default one per CPU.
+    :return: Dict of position name to (sequential, parallel) seconds.
+    """
+    depth = int(depth)
+    workers = None if workers is None else int(workers)
+    results = {}
+    with ParallelSearcher(workers) as parallel:
+        for name in POSITIONS:
+            game = setup_position(name)
+            timer = time.perf_counter()
+            sequential_result = Searcher(game).search(depth)
+            sequential = time.perf_counter() - timer
+            timer = time.perf_counter()
+            parallel_result = parallel.search(game, depth)
+            parallel_seconds = time.perf_counter() - timer
+            if parallel_result.get_score() != sequential_result.get_score():
+                raise ValueError('%s: parallel score %d, sequential %d'
+                                 % (name, parallel_result.get_score(),
+                                    sequential_result.get_score()))
+            results[name] = (sequential, parallel_seconds)
+            print('%-8s depth %d %8.3fs sequential %8.3fs parallel %5.2fx'
+                  % (name, depth, sequential, parallel_seconds,
+                     sequential / parallel_seconds))
+    return results
+
+
+COMMANDS = {
+    'perft': bench_perft,
+    'import': bench_import,
+    'replay': bench_replay,
+    'parallel': bench_parallel,
+}
+
+
+def main(argv):
+    """Runs the benchmark named by the first argument."""
+    if not argv or argv[0] not in COMMANDS:
+        print('usage: python bench.py {%s} [args]' % ','.join(COMMANDS))
+        return 2
+    COMMANDS[argv[0]](*argv[1:])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,111 @@
+# Description: A board core for JanggiGame that keeps one 90-bit integer
+# mask per piece code, so that blocking and screen tests are mask
+# operations. Use it with JanggiGame(board_class=BitBoard).
+
+from Janggi import BETWEEN, CANNON_CODES, CODE_PIECES, SQUARES, piece_code
+
+# Bit y * 9 + x of a mask stands for the square [y, x].
+SQUARE_BITS = [1 << _index for _index in range(90)]
+
+# BETWEEN_MASKS[origin][target] has the bits of the squares between the two
+# squares: the line a chariot or cannon crosses, or the squares that block
+# a horse or elephant.
+BETWEEN_MASKS = []
+for _moves in BETWEEN:
+    _masks = {}
+    for _target, _between in _moves.items():
+        _mask = 0
+        for _row, _col in _between:
+            _mask |= SQUARE_BITS[_row * 9 + _col]
+        _masks[_target] = _mask
+    BETWEEN_MASKS.append(_masks)
+
+
+class BitBoard:
+    """Stores the board as an integer mask for each piece code, a mask of
+    all occupied squares, and a bytearray of codes for looking up the piece
+    on a single square."""
+
+    def __init__(self, cells=None):
+        """
+        Initializes an empty board, or one filled from piece codes.
+        :param cells: Optional sequence of 90 piece codes, row by row.
+        """
+        self._cells = bytearray(90)
+        self._masks = [0] * 16
+        self._occupied = 0
+        if cells is not None:
+            self.set_cells(cells)
+
+    def set_cells(self, cells):
+        """Replaces the board with a sequence of 90 piece codes."""
+        self._cells = bytearray(cells)
+        self._masks = [0] * 16
+        for index, code in enumerate(self._cells):
+            if code:
+                self._masks[code] |= SQUARE_BITS[index]
+        self._occupied = sum(self._masks)
+
+    def get_piece(self, square):
+        """Returns the Piece at a [y, x] square, or None."""
+        return CODE_PIECES[self._cells[square[0] * 9 + square[1]]]
+
+    def set_piece(self, square, piece):
+        """Places a Piece, or None, at a [y, x] square."""
+        index = square[0] * 9 + square[1]
+        bit = SQUARE_BITS[index]
+        old_code = self._cells[index]
+        if old_code:
+            self._masks[old_code] ^= bit
+        code = piece_code(piece)
+        self._cells[index] = code
+        if code:
+            self._masks[code] |= bit
+            self._occupied |= bit
+        else:
+            self._occupied &= ~bit
+
+    def get_mask(self, code):
+        """Returns the mask of the squares holding a piece code."""
+        return self._masks[code]
+
+    def get_occupied(self):
+        """Returns the mask of all occupied squares."""
+        return self._occupied
+
+    def count_between(self, origin, target):
+        """Counts the pieces on the squares between two square indices."""
+        return bin(BETWEEN_MASKS[origin][target] & self._occupied).count('1')
+
+    def count_cannons_between(self, origin, target):
+        """Counts the cannons on the squares between two square indices."""
+        cannons = self._masks[CANNON_CODES[0]] | self._masks[CANNON_CODES[1]]
+        return bin(BETWEEN_MASKS[origin][target] & cannons).count('1')
+
+    def get_rows(self):
+        """Returns a list of rows of Pieces built from the codes. Changing
+        the rows does not change the board."""
+        cells = self._cells
+        return [[CODE_PIECES[code] for code in cells[row:row + 9]]
+                for row in range(0, 90, 9)]
+
+    def set_rows(self, rows):
+        """Replaces the board with a list of rows of Pieces."""
+        self.set_cells(piece_code(piece) for row in rows for piece in row)
+
+    def get_pieces(self):
+        """Yields the [y, x] square and Piece of every occupied square."""
+        occupied = self._occupied
+        while occupied:
+            bit = occupied & -occupied
+            index = bit.bit_length() - 1
+            yield SQUARES[index], CODE_PIECES[self._cells[index]]
+            occupied ^= bit
+
+    def to_bytes(self):
+        """Returns the board as 90 piece codes, row by row."""
+        return bytes(self._cells)
+
+    def copy(self):
+        """Returns an independent copy of the board."""
+        return BitBoard(self._cells)
@@ -0,0 +1,189 @@
+# Description: An opening book of the moves played in archived games, kept
+# in a sorted binary file that is memory-mapped and binary-searched by
+# position hash. Build one from a file of games, one game per line written
+# like 'c7c6 c1d3 b10d7', with:
+#     python book.py build games.txt book.bin [plies]
+
+import mmap
+import struct
+import sys
+from Janggi import JanggiGame, SQUARES, SQUARE_NAMES, parse_moves
+
+# File header: magic bytes and the number of records.
+HEADER = struct.Struct('<8sQ')
+MAGIC = b'JANGGIBK'
+# Record: position hash, start and end square indices, and times played.
+# Records are sorted by hash, then by most played.
+RECORD = struct.Struct('<QBBxxI')
+KEY = struct.Struct('<Q')
+
+
+def count_book_moves(games, plies=20):
+    """
+    Replays games and counts the moves played from each early position.
+    :param games: Iterable of games, each a string of moves for
+    parse_moves() or an iterable of (start, end) pairs in algebraic
+    notation. A game stops at its first illegal or unreadable move.
+    :param plies: Number of moves from the start of each game to count.
+    :return: Dict of (position hash, start index, end index) to count.
+    """
+    counts = {}
+    for moves in games:
+        if isinstance(moves, str):
+            moves = moves.split()  # Each read as it is played, see below
+        game = JanggiGame()
+        for ply, move in enumerate(moves):
+            if ply >= plies:
+                break
+            key = game.get_hash()
+            try:
+                if isinstance(move, str):
+                    (start, end), = parse_moves(move)
+                    start = SQUARE_NAMES[start[0] * 9 + start[1]]
+                    end = SQUARE_NAMES[end[0] * 9 + end[1]]
+                else:
+                    start, end = move
+                legal = game.make_move(start, end)
+            except (ValueError, KeyError, IndexError):
+                legal = False  # Not a move in algebraic notation
+            if not legal:
+                break
+            start = game.convert_algebraic_notation(start)
+            end = game.convert_algebraic_notation(end)
+            entry = (key, start[0] * 9 + start[1], end[0] * 9 + end[1])
+            counts[entry] = counts.get(entry, 0) + 1
+    return counts
+
+
+def write_book(counts, path, min_count=1):
+    """
+    Writes counted moves to a book file.
+    :param counts: Dict returned by count_book_moves().
+    :param path: File to write.
+    :param min_count: Fewest times a move must have been played to be kept.
+    :return: Number of records written.
+    """
+    entries = sorted((key, -count, origin, target)
+                     for (key, origin, target), count in counts.items()
+                     if count >= min_count)
+    with open(path, 'wb') as book_file:
+        book_file.write(HEADER.pack(MAGIC, len(entries)))
+        for key, count, origin, target in entries:
+            book_file.write(RECORD.pack(key, origin, target, -count))
+    return len(entries)
+
+
+def build_book(games, path, plies=20, min_count=1):
+    """
+    Builds a book file from archived games.
+    :param games: Iterable of games, see count_book_moves().
+    :param path: File to write.
+    :param plies: Number of moves from the start of each game to keep.
+    :param min_count: Fewest times a move must have been played to be kept.
+    :return: Number of records written.
+    """
+    return write_book(count_book_moves(games, plies), path, min_count)
+
+
+class OpeningBook:
+    """Reads a book file through a read-only memory map, so that processes
+    opening the same file share its pages."""
+
+    def __init__(self, path):
+        """
+        Opens a book file.
+        :param path: File written by build_book().
+        """
+        with open(path, 'rb') as book_file:
+            self._map = mmap.mmap(book_file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        magic, self._size = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or \
+                len(self._map) != HEADER.size + self._size * RECORD.size:
+            self._map.close()
+            raise ValueError('%s is not an opening book' % path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Unmaps the book file."""
+        self._map.close()
+
+    def get_size(self):
+        """Returns the number of records in the book."""
+        return self._size
+
+    def lookup(self, key):
+        """
+        Finds the book moves of a position.
+        :param key: Position hash, as returned by JanggiGame.get_hash().
+        :return: List of (start, end, count) with [y, x] squares, most
+        played first.
+        """
+        book_map = self._map
+        low = 0
+        high = self._size
+        while low < high:  # First record with a hash of at least key
+            middle = (low + high) // 2
+            if KEY.unpack_from(book_map, HEADER.size +
+                               middle * RECORD.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        moves = []
+        for number in range(low, self._size):
+            record_key, origin, target, count = RECORD.unpack_from(
+                book_map, HEADER.size + number * RECORD.size)
+            if record_key != key:
+                break
+            moves.append((SQUARES[origin], SQUARES[target], count))
+        return moves
+
+    def get_moves(self, game):
+        """
+        Finds the book moves of a game's position that are legal in it,
+        which guards against hash collisions.
+        :param game: JanggiGame.
+        :return: List of (start, end, count) as returned by lookup().
+        """
+        team = game.get_current_turn()
+        moves = []
+        for start, end, count in self.lookup(game.get_hash()):
+            piece = game.get_piece(start)
+            if piece is not None and piece.get_team() == team and \
+                    game.test_move(start, end) and \
+                    game.test_check_break(start, end):
+                moves.append((start, end, count))
+        return moves
+
+    def best_move(self, game):
+        """
+        Returns the most played book move of a game's position.
+        :param game: JanggiGame.
+        :return: (start, end) pair of [y, x] squares, or None if the
+        position is not in the book.
+        """
+        moves = self.get_moves(game)
+        if not moves:
+            return None
+        return moves[0][0], moves[0][1]
+
+
+def main(argv):
+    """Builds a book: book.py build games.txt book.bin [plies]."""
+    if len(argv) not in (3, 4) or argv[0] != 'build':
+        print('usage: python book.py build games.txt book.bin [plies]')
+        return 2
+    with open(argv[1]) as games:
+        records = build_book((line for line in games if line.strip()),
+                             argv[2], *map(int, argv[3:]))
+    print('wrote %d moves to %s' % (records, argv[2]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
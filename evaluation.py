@@ -0,0 +1,86 @@
+# Description: Static evaluation of Janggi positions from material values
+# and piece-square tables. JanggiGame adds up these scores as pieces are
+# placed and removed, so JanggiGame.evaluate() does not scan the board.
+
+# Material value of each piece type. Generals are never captured.
+PIECE_VALUES = {'general': 0, 'guard': 300, 'elephant': 300, 'horse': 500,
+                'cannon': 700, 'chariot': 1300, 'soldier': 200}
+
+# Bonus for a piece of each type on each square, added to its material
+# value. Rows are seen from Red, whose pieces start on rows 0 to 3; Blue uses
+# the rows upside down. Guards and generals only reach palace squares.
+PIECE_SQUARE_TABLES = {
+    'general': [[0, 0, 0, -5, -10, -5, 0, 0, 0],
+                [0, 0, 0, 0, 5, 0, 0, 0, 0],
+                [0, 0, 0, -10, -5, -10, 0, 0, 0]] + [[0] * 9] * 7,
+    'guard': [[0, 0, 0, 0, 0, 0, 0, 0, 0],
+              [0, 0, 0, 0, 5, 0, 0, 0, 0],
+              [0, 0, 0, -5, 0, -5, 0, 0, 0]] + [[0] * 9] * 7,
+    'elephant': [[0, 0, 0, 0, 0, 0, 0, 0, 0],
+                 [0, 0, 0, 0, 0, 0, 0, 0, 0],
+                 [-5, 0, 5, 5, 5, 5, 5, 0, -5],
+                 [-5, 0, 5, 5, 10, 5, 5, 0, -5],
+                 [-5, 0, 5, 10, 10, 10, 5, 0, -5],
+                 [-5, 0, 5, 10, 10, 10, 5, 0, -5],
+                 [-5, 0, 5, 5, 10, 5, 5, 0, -5],
+                 [-5, 0, 0, 5, 5, 5, 0, 0, -5],
+                 [-10, -5, 0, 0, 0, 0, 0, -5, -10],
+                 [-10, -5, -5, -5, -5, -5, -5, -5, -10]],
+    'horse': [[-15, -10, -5, -5, -5, -5, -5, -10, -15],
+              [-10, 0, 0, 0, 0, 0, 0, 0, -10],
+              [-10, 0, 5, 5, 5, 5, 5, 0, -10],
+              [-5, 5, 10, 10, 10, 10, 10, 5, -5],
+              [-5, 5, 10, 15, 15, 15, 10, 5, -5],
+              [-5, 5, 10, 15, 20, 15, 10, 5, -5],
+              [-5, 5, 10, 15, 15, 15, 10, 5, -5],
+              [-5, 5, 10, 15, 15, 15, 10, 5, -5],
+              [-10, 0, 5, 5, 5, 5, 5, 0, -10],
+              [-15, -10, -5, -5, -5, -5, -5, -10, -15]],
+    'chariot': [[-5, 0, 0, 5, 5, 5, 0, 0, -5],
+                [0, 0, 0, 5, 5, 5, 0, 0, 0],
+                [0, 0, 5, 5, 5, 5, 5, 0, 0],
+                [0, 5, 5, 10, 10, 10, 5, 5, 0],
+                [5, 5, 10, 10, 10, 10, 10, 5, 5],
+                [5, 5, 10, 10, 10, 10, 10, 5, 5],
+                [5, 10, 10, 15, 15, 15, 10, 10, 5],
+                [10, 10, 15, 20, 20, 20, 15, 10, 10],
+                [10, 10, 15, 20, 20, 20, 15, 10, 10],
+                [5, 5, 10, 15, 15, 15, 10, 5, 5]],
+    'cannon': [[0, 0, 0, 5, 5, 5, 0, 0, 0],
+               [0, 0, 0, 5, 10, 5, 0, 0, 0],
+               [0, 5, 5, 5, 10, 5, 5, 5, 0],
+               [0, 0, 5, 5, 5, 5, 5, 0, 0],
+               [0, 0, 5, 5, 5, 5, 5, 0, 0],
+               [0, 0, 5, 5, 5, 5, 5, 0, 0],
+               [0, 0, 0, 5, 5, 5, 0, 0, 0],
+               [0, 0, 0, 5, 10, 5, 0, 0, 0],
+               [0, 0, 0, 5, 10, 5, 0, 0, 0],
+               [-5, 0, 0, 0, 5, 0, 0, 0, -5]],
+    'soldier': [[0] * 9,
+                [0] * 9,
+                [0] * 9,
+                [0, 0, 0, 0, 5, 0, 0, 0, 0],
+                [5, 5, 10, 10, 15, 10, 10, 5, 5],
+                [10, 15, 20, 25, 25, 25, 20, 15, 10],
+                [15, 20, 25, 35, 40, 35, 25, 20, 15],
+                [15, 20, 30, 40, 45, 40, 30, 20, 15],
+                [10, 15, 20, 30, 35, 30, 20, 15, 10],
+                [0, 5, 10, 10, 10, 10, 10, 5, 0]],
+}
+
+
+def square_scores(team, piece_type):
+    """
+    Scores a piece on every square: its material value plus its square
+    bonus, positive for Red and negative for Blue.
+    :param team: String, 'red' or 'blue'.
+    :param piece_type: String, a key of PIECE_VALUES.
+    :return: Tuple of 90 scores, indexed by y * 9 + x.
+    """
+    table = PIECE_SQUARE_TABLES[piece_type]
+    value = PIECE_VALUES[piece_type]
+    if team == 'red':
+        return tuple(value + table[row][col]
+                     for row in range(10) for col in range(9))
+    return tuple(-value - table[9 - row][col]
+                 for row in range(10) for col in range(9))
@@ -0,0 +1,111 @@
+# Description: A PyGame interface for playing Janggi. PyGame is imported
+# only when the window is opened, so the rules engine in Janggi.py can be
+# used without it. Run with:
+#     python gui.py
+
+from Janggi import JanggiGame
+
+SQUARE_SIZE = 64
+MARGIN = 48
+STATUS_HEIGHT = 40
+WIDTH = MARGIN * 2 + SQUARE_SIZE * 8
+HEIGHT = MARGIN * 2 + SQUARE_SIZE * 9 + STATUS_HEIGHT
+BOARD_COLOR = (222, 184, 135)
+LINE_COLOR = (60, 40, 20)
+TEAM_COLORS = {'red': (200, 30, 30), 'blue': (30, 60, 200)}
+SELECTED_COLOR = (40, 200, 40)
+
+
+def square_to_pixel(square):
+    """Returns the pixel center of a [y, x] square."""
+    return MARGIN + square[1] * SQUARE_SIZE, MARGIN + square[0] * SQUARE_SIZE
+
+
+def pixel_to_square(position):
+    """Returns the [y, x] square nearest to a pixel, or None if the pixel
+    is off the board."""
+    col = round((position[0] - MARGIN) / SQUARE_SIZE)
+    row = round((position[1] - MARGIN) / SQUARE_SIZE)
+    if 0 <= row < 10 and 0 <= col < 9:
+        return [row, col]
+    return None
+
+
+def draw(pygame, screen, font, game, selected):
+    """
+    Draws the board, pieces and game status.
+    :param pygame: The imported pygame module.
+    :param screen: Surface to draw on.
+    :param font: Font for piece symbols and status text.
+    :param game: JanggiGame to draw.
+    :param selected: The selected [y, x] square, or None.
+    :return: None.
+    """
+    screen.fill(BOARD_COLOR)
+    for row in range(10):
+        pygame.draw.line(screen, LINE_COLOR, square_to_pixel([row, 0]),
+                         square_to_pixel([row, 8]), 2)
+    for col in range(9):
+        pygame.draw.line(screen, LINE_COLOR, square_to_pixel([0, col]),
+                         square_to_pixel([9, col]), 2)
+    for top in (0, 7):  # Palace diagonals
+        pygame.draw.line(screen, LINE_COLOR, square_to_pixel([top, 3]),
+                         square_to_pixel([top + 2, 5]), 2)
+        pygame.draw.line(screen, LINE_COLOR, square_to_pixel([top, 5]),
+                         square_to_pixel([top + 2, 3]), 2)
+    for row_count, row in enumerate(game.get_board()):
+        for col_count, piece in enumerate(row):
+            if piece is None:
+                continue
+            center = square_to_pixel([row_count, col_count])
+            pygame.draw.circle(screen, (250, 240, 220), center,
+                               SQUARE_SIZE // 2 - 6)
+            color = SELECTED_COLOR if selected == [row_count, col_count] \
+                else TEAM_COLORS[piece.get_team()]
+            pygame.draw.circle(screen, color, center, SQUARE_SIZE // 2 - 6, 3)
+            text = font.render(piece.get_image().upper(), True,
+                               TEAM_COLORS[piece.get_team()])
+            screen.blit(text, text.get_rect(center=center))
+    status = game.get_game_state()
+    if status == 'UNFINISHED':
+        status = game.get_current_turn() + ' to move'
+        if game.is_in_check(game.get_current_turn()):
+            status += ' (check)'
+    text = font.render(status, True, LINE_COLOR)
+    screen.blit(text, (MARGIN, HEIGHT - STATUS_HEIGHT))
+
+
+def main():
+    """Opens the game window. Click a piece, then its destination; click
+    a piece twice to pass the turn."""
+    import pygame
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption('Janggi')
+    font = pygame.font.SysFont(None, 32)
+    game = JanggiGame()
+    selected = None
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                square = pixel_to_square(event.pos)
+                if square is None:
+                    selected = None
+                elif selected is None:
+                    if game.get_piece(square) is not None:
+                        selected = square
+                else:
+                    game.make_move(
+                        game.convert_to_algebraic_notation(selected),
+                        game.convert_to_algebraic_notation(square))
+                    selected = None
+        draw(pygame, screen, font, game, selected)
+        pygame.display.flip()
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
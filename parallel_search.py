@@ -0,0 +1,170 @@
+# Description: Searches the root moves of a position in parallel over a
+# pool of worker processes. Workers rebuild the position from its position
+# string, and share the best root score found so far through shared
+# memory, so that every worker searches with the tightest alpha bound.
+# Given a transposition table, the workers also share the positions they
+# have searched through it.
+#     with ParallelSearcher(workers=4) as searcher:
+#         result = searcher.search(game, time_limit=5.0)
+
+import multiprocessing
+import time
+from Janggi import JanggiGame, SQUARES
+from search import INFINITY, MATE_SCORE, Searcher, SearchResult, \
+    SearchTimeout
+
+_shared_alpha = None  # Best root score so far, set in each worker
+_worker_table = None  # SharedTranspositionTable, or None
+_worker_searcher = None  # Searcher of the last position, reused by depth
+
+
+def _init_worker(shared_alpha, table=None):
+    """Stores the shared alpha bound and transposition table in a new
+    worker process."""
+    global _shared_alpha, _worker_table
+    _shared_alpha = shared_alpha
+    _worker_table = table
+
+
+def _search_root_move(fen, origin, target, depth, deadline):
+    """
+    Scores one root move in a worker process.
+    :param fen: Position string of the root, from JanggiGame.to_fen().
+    :param origin: Start square index of the move.
+    :param target: End square index of the move.
+    :param depth: Depth of the root search.
+    :param deadline: time.time() by which to stop, or None.
+    :return: Tuple of origin, target, score, whether the score is exact,
+    principal variation and nodes searched. The score is None if the move
+    is illegal or the deadline passed.
+    """
+    global _worker_searcher
+    if _worker_searcher is None or \
+            _worker_searcher.get_game().to_fen() != fen:
+        _worker_searcher = Searcher(JanggiGame.from_fen(fen),
+                                    table=_worker_table)
+    searcher = _worker_searcher
+    searcher.start_clock(None if deadline is None
+                         else max(deadline - time.time(), 0.0))
+    alpha = _shared_alpha.value
+    try:
+        result = searcher.search_move((SQUARES[origin], SQUARES[target]),
+                                      depth, alpha)
+    except SearchTimeout:
+        result = None
+    if result is None:
+        return origin, target, None, False, [], searcher.get_nodes()
+    score, pv = result
+    if score > alpha:
+        with _shared_alpha.get_lock():
+            if score > _shared_alpha.value:
+                _shared_alpha.value = score
+    return origin, target, score, score > alpha, pv, searcher.get_nodes()
+
+
+class ParallelSearcher:
+    """Splits the root moves of each iterative deepening depth over a pool
+    of worker processes."""
+
+    def __init__(self, workers=None, table=None):
+        """
+        Starts the worker processes.
+        :param workers: Number of processes, by default one per CPU.
+        :param table: Optional SharedTranspositionTable for the workers to
+        share. It is not closed with the searcher.
+        """
+        self._shared_alpha = multiprocessing.Value('q', -INFINITY)
+        self._pool = multiprocessing.Pool(workers, _init_worker,
+                                          (self._shared_alpha, table))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stops the worker processes."""
+        self._pool.terminate()
+        self._pool.join()
+
+    def search(self, game, max_depth=64, time_limit=None):
+        """
+        Searches one depth deeper at a time until max_depth is done or the
+        time limit runs out, like Searcher.search(). At each depth every
+        root move is searched in a worker, the best move of the last depth
+        first. A move whose score cannot beat the shared alpha is only
+        known to be no better, so the best move is the highest exact score.
+        If not even depth 1 finishes with an exact score, the first root
+        move is returned, unscored.
+        :param game: JanggiGame to search for its current player. It is not
+        changed.
+        :param max_depth: Deepest depth to search.
+        :param time_limit: Seconds allowed for the search, or None.
+        :return: SearchResult.
+        """
+        start_time = time.perf_counter()
+        deadline = None if time_limit is None else time.time() + time_limit
+        fen = game.to_fen()
+        team = game.get_current_turn()
+        moves = [(start[0] * 9 + start[1], end[0] * 9 + end[1])
+                 for start, end in game.legal_moves(team)]
+        result = SearchResult(None, 0, 0, [], 0, 0.0)
+        if not moves:
+            return result
+        nodes = 0
+        for depth in range(1, max_depth + 1):
+            self._shared_alpha.value = -INFINITY
+            tasks = [(fen, origin, target, depth, deadline)
+                     for origin, target in moves]
+            scores = {}
+            best = None
+            finished = True
+            for origin, target, score, exact, pv, move_nodes in \
+                    self._pool.imap_unordered(_search_root_move_task, tasks):
+                nodes += move_nodes
+                if score is None:
+                    finished = False  # Timed out
+                    continue
+                scores[origin, target] = score
+                if exact and (best is None or score > best[0]):
+                    best = (score, pv)
+            if not finished or best is None:
+                break  # Throw the unfinished depth away
+            score, pv = best
+            result = SearchResult(pv[0], score, depth, pv, nodes,
+                                  time.perf_counter() - start_time)
+            if abs(score) >= MATE_SCORE - max_depth:
+                break  # A forced mate was found
+            best_move = (pv[0][0][0] * 9 + pv[0][0][1],
+                         pv[0][1][0] * 9 + pv[0][1][1])
+            moves.sort(key=lambda move: (move != best_move, -scores[move]))
+        if result.get_move() is None:
+            move = (SQUARES[moves[0][0]], SQUARES[moves[0][1]])
+            result = SearchResult(move, 0, 0, [move], nodes,
+                                  time.perf_counter() - start_time)
+        return result
+
+
+def _search_root_move_task(task):
+    """Unpacks a task tuple for Pool.imap_unordered()."""
+    return _search_root_move(*task)
+
+
+def parallel_find_best_move(game, max_depth=64, time_limit=None,
+                            workers=None):
+    """
+    Searches a game in parallel and returns the best move in algebraic
+    notation.
+    :param game: The JanggiGame to search for its current player.
+    :param max_depth: Deepest depth to search.
+    :param time_limit: Seconds allowed for the search, or None.
+    :param workers: Number of processes, by default one per CPU.
+    :return: Tuple of start and end notation, or None if there is no move.
+    """
+    with ParallelSearcher(workers) as searcher:
+        move = searcher.search(game, max_depth, time_limit).get_move()
+    if move is None:
+        return None
+    return (game.convert_to_algebraic_notation(move[0]),
+            game.convert_to_algebraic_notation(move[1]))
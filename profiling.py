@@ -0,0 +1,121 @@
+# Description: Opt-in call counters and timers for the JanggiGame move
+# pipeline. While profiling is off the methods are the plain ones, so it
+# costs nothing. Turn it on for a block of code:
+#     with profiling.profile() as stats:
+#         game.make_move('c7', 'c6')
+#     print(stats.to_json())
+# or for a whole process by setting the JANGGI_PROFILE environment variable
+# to 1 before Janggi is imported.
+
+import functools
+import json
+import os
+import time
+from contextlib import contextmanager
+from Janggi import JanggiGame
+
+# JanggiGame methods that are counted and timed. make_move() and the
+# checkmate test generate moves and probe for checks rather than calling
+# test_move(), so it is not among them.
+PROFILED_METHODS = ('check_valid_move', 'test_checks', 'checkmate_checker',
+                    'test_check_break', 'legal_moves', 'pseudo_legal_moves',
+                    'is_general_attacked')
+
+# Method name to a [calls, nanoseconds] pair, updated in place.
+_counters = {name: [0, 0] for name in PROFILED_METHODS}
+_originals = {}  # Method name to the plain method while profiling is on
+
+
+class ProfileStats:
+    """A view of the counters that reads the current numbers."""
+
+    def get_stats(self):
+        """Returns the counters, see get_stats()."""
+        return get_stats()
+
+    def to_json(self):
+        """Returns the counters as JSON, see to_json()."""
+        return to_json()
+
+
+def _timed(name, method):
+    """Returns a method that counts and times its calls of method."""
+    counter = _counters[name]
+    perf_counter_ns = time.perf_counter_ns
+
+    @functools.wraps(method)
+    def timed(*args, **kwargs):
+        start = perf_counter_ns()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            counter[0] += 1
+            counter[1] += perf_counter_ns() - start
+    return timed
+
+
+def is_enabled():
+    """Returns if the methods are being counted."""
+    return bool(_originals)
+
+
+def enable():
+    """Starts counting and timing the PROFILED_METHODS of every game."""
+    if _originals:
+        return
+    for name in PROFILED_METHODS:
+        _originals[name] = getattr(JanggiGame, name)
+        setattr(JanggiGame, name, _timed(name, _originals[name]))
+
+
+def disable():
+    """Puts the plain methods back. The counters keep their numbers."""
+    for name, method in _originals.items():
+        setattr(JanggiGame, name, method)
+    _originals.clear()
+
+
+def reset():
+    """Sets every counter back to zero."""
+    for counter in _counters.values():
+        counter[0] = counter[1] = 0
+
+
+def get_stats():
+    """
+    Returns the counters. Times include the time spent in nested profiled
+    methods, for example test_check_break within checkmate_checker.
+    :return: Dict of method name to a dict of 'calls' and 'ns', the
+    cumulative nanoseconds spent in the method.
+    """
+    return {name: {'calls': calls, 'ns': ns}
+            for name, (calls, ns) in _counters.items()}
+
+
+def to_json():
+    """Returns the counters of get_stats() as a JSON string."""
+    return json.dumps(get_stats(), sort_keys=True)
+
+
+@contextmanager
+def profile():
+    """
+    Resets the counters and profiles the methods inside a with block. If
+    profiling was already on, it stays on afterwards.
+    :return: ProfileStats, yielded to the with block.
+    """
+    was_enabled = is_enabled()
+    reset()
+    enable()
+    try:
+        yield ProfileStats()
+    finally:
+        if not was_enabled:
+            disable()
+
+
+# Janggi imports this module when JANGGI_PROFILE is set, and this module
+# imports Janggi, so the check is made here, after everything is defined,
+# whichever of the two is imported first.
+if os.environ.get('JANGGI_PROFILE', '0') not in ('', '0'):
+    enable()
@@ -0,0 +1,119 @@
+# Description: Replays and validates many recorded Janggi games, spread over
+# a pool of worker processes. For example:
+#     for result in replay_games(games, workers=8):
+#         print(result.get_game_number(), result.get_game_state())
+
+import multiprocessing
+from Janggi import JanggiGame, SQUARE_NAMES, parse_moves
+
+
+class ReplayResult:
+    """The outcome of replaying one game: its final state, the first move
+    that could not be made, and every check given along the way."""
+
+    def __init__(self, game_number, game_state, moves_played, illegal_move,
+                 checks):
+        """
+        Initializes the replay result.
+        :param game_number: Position of the game in the replayed games.
+        :param game_state: get_game_state() after the last move made.
+        :param moves_played: Number of moves made.
+        :param illegal_move: Index of the first move make_move() refused,
+        or None if every move was made.
+        :param checks: List of (move index, team in check) pairs.
+        """
+        self._game_number = game_number
+        self._game_state = game_state
+        self._moves_played = moves_played
+        self._illegal_move = illegal_move
+        self._checks = checks
+
+    def get_game_number(self):
+        """Returns the position of the game in the replayed games."""
+        return self._game_number
+
+    def get_game_state(self):
+        """Returns the game state after the last move made."""
+        return self._game_state
+
+    def get_moves_played(self):
+        """Returns the number of moves made."""
+        return self._moves_played
+
+    def get_illegal_move(self):
+        """Returns the index of the first illegal move, or None."""
+        return self._illegal_move
+
+    def get_checks(self):
+        """Returns the list of (move index, team in check) pairs."""
+        return self._checks
+
+    def is_valid(self):
+        """Returns if every move of the game was legal."""
+        return self._illegal_move is None
+
+
+def replay_game(moves, game_number=0):
+    """
+    Plays a game's moves with make_move(), stopping at the first move that
+    is refused or cannot be read.
+    :param moves: String of moves for parse_moves(), or iterable of
+    (start, end) pairs in algebraic notation.
+    :param game_number: Position of the game in the replayed games.
+    :return: ReplayResult.
+    """
+    if isinstance(moves, str):
+        moves = moves.split()  # Each read as it is played, see below
+    game = JanggiGame()
+    checks = []
+    illegal_move = None
+    moves_played = 0
+    for index, move in enumerate(moves):
+        try:
+            if isinstance(move, str):
+                (start, end), = parse_moves(move)
+                start = SQUARE_NAMES[start[0] * 9 + start[1]]
+                end = SQUARE_NAMES[end[0] * 9 + end[1]]
+            else:
+                start, end = move
+            legal = game.make_move(start, end)
+        except (ValueError, TypeError, KeyError, IndexError):
+            legal = False  # Not a move in algebraic notation
+        if not legal:
+            illegal_move = index
+            break
+        moves_played += 1
+        for team in ('red', 'blue'):
+            if game.is_in_check(team):
+                checks.append((index, team))
+    return ReplayResult(game_number, game.get_game_state(), moves_played,
+                        illegal_move, checks)
+
+
+def _replay_numbered(numbered_moves):
+    """Replays a (game number, moves) pair in a worker process."""
+    return replay_game(numbered_moves[1], numbered_moves[0])
+
+
+def replay_games(games, workers=None, chunksize=64):
+    """
+    Replays many games over a pool of worker processes, yielding each
+    result as soon as it and all earlier ones are done. Games are handed to
+    the workers in chunks to keep the cost of sending them small.
+    :param games: Iterable of games, each a string of moves for
+    parse_moves() or an iterable of (start, end) pairs in algebraic
+    notation. It is read lazily.
+    :param workers: Number of worker processes, by default one per CPU.
+    With 1, games are replayed in this process.
+    :param chunksize: Number of games sent to a worker at a time.
+    :return: Generator of ReplayResult, in the order of the games.
+    """
+    numbered = ((number, moves if isinstance(moves, str) else list(moves))
+                for number, moves in enumerate(games))
+    if workers == 1:
+        for numbered_moves in numbered:
+            yield _replay_numbered(numbered_moves)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        for result in pool.imap(_replay_numbered, numbered, chunksize):
+            yield result
@@ -0,0 +1,359 @@
+# Description: An alpha-beta search engine for Janggi, built on the
+# make/unmake moves of JanggiGame.
+
+import time
+from evaluation import PIECE_VALUES
+from Janggi import SQUARES
+from transposition import EXACT, LOWER, UPPER
+
+MATE_SCORE = 100000
+# Scores beyond this are mates, stored in the transposition table as the
+# distance to mate from the stored position rather than from the root.
+MATE_THRESHOLD = MATE_SCORE - 1000
+INFINITY = 1000000
+# Most plies of captures and check evasions searched past the full depth.
+QUIESCENCE_DEPTH = 8
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when its time budget runs out."""
+
+
+class SearchResult:
+    """The outcome of a search: the best move found, its score and the
+    principal variation leading from it."""
+
+    def __init__(self, move, score, depth, pv, nodes, seconds):
+        """
+        Initializes the search result.
+        :param move: Best (start, end) move in [y, x] squares, or None if
+        the side to move has no moves.
+        :param score: Score of the move for the side to move.
+        :param depth: Deepest fully searched depth.
+        :param pv: List of (start, end) moves expected to be played.
+        :param nodes: Number of positions searched.
+        :param seconds: Time spent searching.
+        """
+        self._move = move
+        self._score = score
+        self._depth = depth
+        self._pv = pv
+        self._nodes = nodes
+        self._seconds = seconds
+
+    def get_move(self):
+        """Returns the best (start, end) move, or None."""
+        return self._move
+
+    def get_score(self):
+        """Returns the score of the best move for the side to move."""
+        return self._score
+
+    def get_depth(self):
+        """Returns the deepest fully searched depth."""
+        return self._depth
+
+    def get_pv(self):
+        """Returns the principal variation as a list of moves."""
+        return self._pv
+
+    def get_nodes(self):
+        """Returns the number of positions searched."""
+        return self._nodes
+
+    def get_seconds(self):
+        """Returns the time spent searching."""
+        return self._seconds
+
+
+class Searcher:
+    """Searches a JanggiGame with negamax alpha-beta and iterative
+    deepening. Moves are made and taken back on the game itself, which is
+    left unchanged when the search returns."""
+
+    def __init__(self, game, tablebase=None, table=None):
+        """
+        Initializes the searcher.
+        :param game: The JanggiGame to search, with the side to move being
+        its current turn.
+        :param tablebase: Optional Tablebase, whose exact scores replace the
+        search below the root in positions it has tables for.
+        :param table: Optional SharedTranspositionTable, which may be shared
+        with searchers in other processes.
+        """
+        self._game = game
+        self._tablebase = tablebase
+        self._table = table
+        self._nodes = 0
+        self._deadline = None
+        self._best_moves = {}  # Position hash to best move, for ordering
+
+    def get_game(self):
+        """Returns the game being searched."""
+        return self._game
+
+    def get_nodes(self):
+        """Returns the number of positions searched since the clock was
+        started."""
+        return self._nodes
+
+    def start_clock(self, time_limit=None):
+        """
+        Resets the node count and starts the time budget of a search.
+        :param time_limit: Seconds allowed from now, or None.
+        :return: None.
+        """
+        self._nodes = 0
+        self._deadline = None if time_limit is None \
+            else time.perf_counter() + time_limit
+
+    def search_move(self, move, depth, alpha=-INFINITY, beta=INFINITY):
+        """
+        Scores one move of the side to move, searching the position after
+        it to depth - 1. Raises SearchTimeout if the time budget runs out.
+        :param move: (start, end) move in [y, x] squares.
+        :param depth: Depth of the position before the move.
+        :param alpha: Lowest score the side to move is already sure of.
+        :param beta: Score above which the other side avoids this position.
+        :return: Tuple of score and principal variation starting with the
+        move, or None if the move leaves the mover's general in check.
+        """
+        game = self._game
+        team = game.get_current_turn()
+        record = game.apply_move(move[0], move[1])
+        if game.is_general_attacked(team):
+            game.unmake_move(record)
+            return None
+        game.set_current_turn('red' if team == 'blue' else 'blue')
+        try:
+            score, pv = self.negamax(depth - 1, -beta, -alpha, 1)
+        finally:
+            game.set_current_turn(team)
+            game.unmake_move(record)
+        return -score, [move] + pv
+
+    def search(self, max_depth=64, time_limit=None):
+        """
+        Searches one depth deeper at a time until max_depth is done or the
+        time limit runs out. An unfinished depth is thrown away, except that
+        depth 1 is always finished, so that a move is found whenever the
+        side to move has one.
+        :param max_depth: Deepest depth to search.
+        :param time_limit: Seconds allowed for the search, or None.
+        :return: SearchResult.
+        """
+        start_time = time.perf_counter()
+        self.start_clock(time_limit)
+        deadline = self._deadline
+        result = SearchResult(None, 0, 0, [], 0, 0.0)
+        for depth in range(1, max_depth + 1):
+            self._deadline = None if depth == 1 else deadline
+            try:
+                score, pv = self.negamax(depth, -INFINITY, INFINITY, 0)
+            except SearchTimeout:
+                break
+            result = SearchResult(pv[0] if pv else None, score, depth, pv,
+                                  self._nodes,
+                                  time.perf_counter() - start_time)
+            if not pv or abs(score) >= MATE_SCORE - max_depth:
+                break  # No moves, or a forced mate was found
+        return result
+
+    def negamax(self, depth, alpha, beta, ply):
+        """
+        Scores the current position for the side to move.
+        :param depth: Remaining depth.
+        :param alpha: Lowest score the side to move is already sure of.
+        :param beta: Score above which the other side avoids this position.
+        :param ply: Distance from the root, used to prefer quicker mates.
+        :return: Tuple of score and principal variation.
+        """
+        self._nodes += 1
+        if self._deadline is not None and self._nodes & 1023 == 0 and \
+                time.perf_counter() > self._deadline:
+            raise SearchTimeout()
+        game = self._game
+        team = game.get_current_turn()
+        if ply and self._tablebase is not None:
+            probe = self._tablebase.probe(game)
+            if probe is not None:
+                return self.tablebase_score(probe, ply), []
+        if depth <= 0:
+            return self.quiesce(alpha, beta, ply, QUIESCENCE_DEPTH), []
+        table = self._table
+        if table is not None and ply:
+            entry = table.probe(game.get_hash())
+            if entry is not None and entry[0] >= depth:
+                score = entry[2]
+                if score > MATE_THRESHOLD:
+                    score -= ply
+                elif score < -MATE_THRESHOLD:
+                    score += ply
+                if entry[1] == EXACT or \
+                        entry[1] == LOWER and score >= beta or \
+                        entry[1] == UPPER and score <= alpha:
+                    return score, []
+        original_alpha = alpha
+        other = 'red' if team == 'blue' else 'blue'
+        best_score = -INFINITY
+        best_pv = []
+        for move in self.order_moves(game.pseudo_legal_moves(team)):
+            record = game.apply_move(move[0], move[1])
+            if game.is_general_attacked(team):
+                game.unmake_move(record)  # Leaves own general in check
+                continue
+            game.set_current_turn(other)
+            try:
+                score, pv = self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                game.set_current_turn(team)
+                game.unmake_move(record)
+            score = -score
+            if score > best_score:
+                best_score = score
+                best_pv = [move] + pv
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break  # The other side will avoid this position
+        if not best_pv:
+            if game.is_general_attacked(team):
+                return -MATE_SCORE + ply, []  # Checkmated
+            game.set_current_turn(other)  # No moves, so pass the turn
+            try:
+                score, pv = self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                game.set_current_turn(team)
+            return -score, []
+        self._best_moves[game.get_hash()] = best_pv[0]
+        if table is not None:
+            score = best_score
+            if score > MATE_THRESHOLD:
+                score += ply  # Moves to mate from this position
+            elif score < -MATE_THRESHOLD:
+                score -= ply
+            table.store(game.get_hash(), depth,
+                        LOWER if best_score >= beta else
+                        UPPER if best_score <= original_alpha else EXACT,
+                        score, best_pv[0])
+        return best_score, best_pv
+
+    def quiesce(self, alpha, beta, ply, depth):
+        """
+        Scores a position at the end of the full-depth search by searching
+        only captures, so that the score is not taken in the middle of an
+        exchange. The side to move may stand pat on the evaluation instead
+        of capturing, unless it is in check, when every evasion is searched.
+        :param alpha: Lowest score the side to move is already sure of.
+        :param beta: Score above which the other side avoids this position.
+        :param ply: Distance from the root, used to prefer quicker mates.
+        :param depth: Plies left before standing pat regardless.
+        :return: Score.
+        """
+        self._nodes += 1
+        if self._deadline is not None and self._nodes & 1023 == 0 and \
+                time.perf_counter() > self._deadline:
+            raise SearchTimeout()
+        game = self._game
+        team = game.get_current_turn()
+        in_check = game.is_general_attacked(team)
+        if in_check and depth > 0:
+            best_score = -MATE_SCORE + ply  # Unless an evasion is found
+            moves = game.pseudo_legal_moves(team)
+        else:
+            best_score = self.evaluate()  # Stand pat
+            if best_score >= beta or depth <= 0:
+                return best_score
+            moves = game.capture_moves(team)
+        if best_score > alpha:
+            alpha = best_score
+        other = 'red' if team == 'blue' else 'blue'
+        for move in self.order_moves(moves):
+            record = game.apply_move(move[0], move[1])
+            if game.is_general_attacked(team):
+                game.unmake_move(record)  # Leaves own general in check
+                continue
+            game.set_current_turn(other)
+            try:
+                score = -self.quiesce(-beta, -alpha, ply + 1, depth - 1)
+            finally:
+                game.set_current_turn(team)
+                game.unmake_move(record)
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break  # The other side will avoid this position
+        return best_score
+
+    def tablebase_score(self, probe, ply):
+        """
+        Converts a tablebase result to a search score.
+        :param probe: Tuple of 'WIN', 'LOSS' or 'DRAW' and moves to mate,
+        as returned by Tablebase.probe().
+        :param ply: Distance from the root.
+        :return: Score for the side to move.
+        """
+        result, moves = probe
+        if result == 'WIN':
+            return MATE_SCORE - ply - moves
+        if result == 'LOSS':
+            return -MATE_SCORE + ply + moves
+        return 0
+
+    def order_moves(self, moves):
+        """
+        Sorts moves so that the last best move from this position, found by
+        this searcher or in the transposition table, comes first, then
+        captures of the most valuable pieces, taken by the
+        least valuable attacker.
+        :param moves: List of (start, end) moves.
+        :return: Sorted list of moves.
+        """
+        game = self._game
+        best_move = self._best_moves.get(game.get_hash())
+        if best_move is None and self._table is not None:
+            entry = self._table.probe(game.get_hash())
+            if entry is not None and entry[3] is not None:
+                best_move = (SQUARES[entry[3][0]], SQUARES[entry[3][1]])
+        keys = []
+        for move in moves:
+            if move == best_move:
+                keys.append((-INFINITY, move))
+                continue
+            captured = game.get_piece(move[1])
+            if captured is None:
+                keys.append((0, move))
+            else:
+                keys.append((PIECE_VALUES[game.get_piece(
+                    move[0]).get_type()] // 100 - PIECE_VALUES[
+                    captured.get_type()], move))
+        keys.sort(key=lambda pair: pair[0])
+        return [move for key, move in keys]
+
+    def evaluate(self):
+        """Returns the score of the position for the side to move."""
+        return self._game.evaluate()
+
+
+def find_best_move(game, max_depth=64, time_limit=None, book=None,
+                   tablebase=None):
+    """
+    Searches a game and returns the best move in algebraic notation.
+    :param game: The JanggiGame to search for its current player.
+    :param max_depth: Deepest depth to search.
+    :param time_limit: Seconds allowed for the search, or None.
+    :param book: Optional OpeningBook, whose most played move is returned
+    without searching when the position is in it.
+    :param tablebase: Optional Tablebase for the search to probe.
+    :return: Tuple of start and end notation, or None if there is no move.
+    """
+    move = None if book is None else book.best_move(game)
+    if move is None:
+        move = Searcher(game, tablebase).search(max_depth,
+                                                time_limit).get_move()
+    if move is None:
+        return None
+    return (game.convert_to_algebraic_notation(move[0]),
+            game.convert_to_algebraic_notation(move[1]))
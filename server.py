@@ -0,0 +1,309 @@
+# Description: An asyncio TCP server that hosts many Janggi games over a
+# line protocol. Run with:
+#     python server.py [port]
+#
+# Each request is one line of words, answered with one line. Clients that
+# create or join a game are sent a line whenever its state changes.
+#     NEW                       -> GAME <id>, then STATE
+#     JOIN <id>                 -> STATE
+#     STATE <id>                -> STATE <id> <game state> <position string>
+#     MOVE <id> <start> <end>   -> MOVED <id> <start> <end> to every player,
+#                                  then STATE, or ILLEGAL <id> <start> <end>
+#     ENGINE <id> [seconds]     -> the engine moves for the player to move,
+#                                  answered like MOVE
+#     QUIT                      -> BYE
+# Errors are answered with ERROR <message>. Moves run in a thread pool,
+# since make_move() tests for checkmate, and engine searches in a process
+# pool, so the event loop is never blocked. A game is read and moved in
+# only under its lock, and is dropped once the last client following it
+# leaves.
+
+import asyncio
+import concurrent.futures
+import inspect
+import math
+import sys
+from Janggi import JanggiGame
+from search import find_best_move
+
+DEFAULT_PORT = 8765
+ENGINE_SECONDS = 1.0  # Default engine thinking time
+MAX_ENGINE_SECONDS = 30.0
+
+
+def engine_move(fen, seconds):
+    """
+    Chooses a move in a worker process.
+    :param fen: Position string from JanggiGame.to_fen().
+    :param seconds: Time allowed for the search.
+    :return: Tuple of start and end notation, or None if there is no move.
+    """
+    return find_best_move(JanggiGame.from_fen(fen), time_limit=seconds)
+
+
+class GameSession:
+    """A hosted game, the clients following it, and a lock so that only one
+    move is made on it at a time."""
+
+    def __init__(self, game_id):
+        """
+        Initializes a new game.
+        :param game_id: String identifying the game.
+        """
+        self._game_id = game_id
+        self._game = JanggiGame()
+        self._lock = asyncio.Lock()
+        self._players = set()  # StreamWriters of the following clients
+
+    def get_game_id(self):
+        """Returns the string identifying the game."""
+        return self._game_id
+
+    def get_game(self):
+        """Returns the JanggiGame."""
+        return self._game
+
+    def get_lock(self):
+        """Returns the lock held while the game is read or moved in."""
+        return self._lock
+
+    def get_players(self):
+        """Returns the set of writers of the clients following the game."""
+        return self._players
+
+    def state_line(self):
+        """Returns the STATE line of the game."""
+        return 'STATE %s %s %s' % (self._game_id,
+                                   self._game.get_game_state(),
+                                   self._game.to_fen())
+
+
+class GameServer:
+    """Serves games to TCP clients from one event loop."""
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, move_workers=4,
+                 engine_workers=None):
+        """
+        Initializes the server without starting it.
+        :param host: Address to listen on.
+        :param port: Port to listen on, 0 for any free port.
+        :param move_workers: Threads for making moves.
+        :param engine_workers: Processes for engine searches, by default
+        one per CPU.
+        """
+        self._host = host
+        self._port = port
+        self._sessions = {}  # Game id to GameSession
+        self._next_id = 1
+        self._server = None
+        self._move_executor = concurrent.futures.ThreadPoolExecutor(
+            move_workers)
+        self._engine_executor = concurrent.futures.ProcessPoolExecutor(
+            engine_workers)
+        self._commands = {
+            'NEW': self.command_new,
+            'JOIN': self.command_join,
+            'STATE': self.command_state,
+            'MOVE': self.command_move,
+            'ENGINE': self.command_engine,
+        }
+
+    async def start(self):
+        """Starts listening for clients."""
+        self._server = await asyncio.start_server(self.handle_client,
+                                                  self._host, self._port)
+
+    async def close(self):
+        """Stops listening and shuts down the worker pools."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._move_executor.shutdown(wait=False)
+        self._engine_executor.shutdown(wait=False)
+
+    def get_port(self):
+        """Returns the port the server is listening on."""
+        return self._server.sockets[0].getsockname()[1]
+
+    def get_session(self, game_id):
+        """Returns the GameSession of a game id, or None."""
+        return self._sessions.get(game_id)
+
+    def drop_session(self, session):
+        """Forgets a game, such as one that nobody follows any more."""
+        if self._sessions.get(session.get_game_id()) is session:
+            del self._sessions[session.get_game_id()]
+
+    async def handle_client(self, reader, writer):
+        """Answers one client's requests until it quits or disconnects."""
+        following = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                words = line.decode(errors='replace').split()
+                if not words:
+                    continue
+                if words[0].upper() == 'QUIT':
+                    await self.send(writer, 'BYE')
+                    break
+                command = self._commands.get(words[0].upper())
+                if command is None:
+                    reply = 'ERROR unknown command %s' % words[0]
+                elif not self.takes_arguments(command, words[1:]):
+                    reply = 'ERROR wrong arguments for %s' % words[0]
+                else:
+                    reply = await command(writer, following, *words[1:])
+                if reply is not None:
+                    await self.send(writer, reply)
+        except ConnectionError:
+            pass  # Client went away
+        finally:
+            for session in following:
+                session.get_players().discard(writer)
+                if not session.get_players():
+                    self.drop_session(session)
+            writer.close()
+
+    @staticmethod
+    def takes_arguments(command, arguments):
+        """Returns whether a command accepts the words of a request."""
+        try:
+            inspect.signature(command).bind(None, None, *arguments)
+        except TypeError:
+            return False
+        return True
+
+    async def send(self, writer, line):
+        """Sends a line to one client."""
+        writer.write(line.encode() + b'\n')
+        await writer.drain()
+
+    def broadcast(self, session, line):
+        """Sends a line to every client following a game, without waiting
+        for slow clients."""
+        data = line.encode() + b'\n'
+        for writer in list(session.get_players()):
+            if writer.is_closing():
+                session.get_players().discard(writer)
+            else:
+                writer.write(data)
+
+    async def command_new(self, writer, following):
+        """NEW: creates a game and follows it."""
+        game_id = str(self._next_id)
+        self._next_id += 1
+        session = GameSession(game_id)
+        self._sessions[game_id] = session
+        await self.send(writer, 'GAME %s' % game_id)
+        return await self.command_join(writer, following, game_id)
+
+    async def command_join(self, writer, following, game_id):
+        """JOIN <id>: follows a game."""
+        session = self._sessions.get(game_id)
+        if session is None:
+            return 'ERROR no game %s' % game_id
+        session.get_players().add(writer)
+        following.add(session)
+        async with session.get_lock():
+            return session.state_line()
+
+    async def command_state(self, writer, following, game_id):
+        """STATE <id>: describes a game."""
+        session = self._sessions.get(game_id)
+        if session is None:
+            return 'ERROR no game %s' % game_id
+        async with session.get_lock():
+            return session.state_line()
+
+    async def command_move(self, writer, following, game_id, start, end):
+        """MOVE <id> <start> <end>: makes a move and tells the players."""
+        session = self._sessions.get(game_id)
+        if session is None:
+            return 'ERROR no game %s' % game_id
+        return await self.play(session, writer, start, end)
+
+    async def command_engine(self, writer, following, game_id,
+                             seconds=ENGINE_SECONDS):
+        """ENGINE <id> [seconds]: the engine moves for the player to move."""
+        session = self._sessions.get(game_id)
+        if session is None:
+            return 'ERROR no game %s' % game_id
+        try:
+            limit = float(seconds)
+        except ValueError:
+            return 'ERROR bad time %s' % seconds
+        if not (math.isfinite(limit) and limit > 0):
+            return 'ERROR bad time %s' % seconds
+        seconds = min(limit, MAX_ENGINE_SECONDS)
+        async with session.get_lock():
+            game = session.get_game()
+            if game.get_game_state() != 'UNFINISHED':
+                return 'ERROR game %s is over' % game_id
+            fen = game.to_fen()
+        loop = asyncio.get_running_loop()
+        move = await loop.run_in_executor(self._engine_executor, engine_move,
+                                          fen, seconds)
+        if move is None:
+            return 'ERROR no move in game %s' % game_id
+        return await self.play(session, writer, *move, fen=fen)
+
+    async def play(self, session, writer, start, end, fen=None):
+        """
+        Makes a move in the thread pool and, if it is legal, sends the move
+        and the new state to every player.
+        :param session: GameSession to move in.
+        :param writer: Writer of the client asking for the move.
+        :param start: Start square in algebraic notation.
+        :param end: End square in algebraic notation.
+        :param fen: Position string the move was chosen for, or None. The
+        move is not made if the game has since moved on.
+        :return: Line for the asking client, or None if it was told with
+        the other players.
+        """
+        loop = asyncio.get_running_loop()
+        async with session.get_lock():
+            if fen is not None and session.get_game().to_fen() != fen:
+                return 'ERROR game %s changed during the engine search' \
+                    % session.get_game_id()
+            try:
+                legal = await loop.run_in_executor(
+                    self._move_executor, session.get_game().make_move,
+                    start, end)
+            except (KeyError, IndexError):
+                legal = False  # Not a square in algebraic notation
+            if not legal:
+                return 'ILLEGAL %s %s %s' % (session.get_game_id(), start,
+                                             end)
+            self.broadcast(session, 'MOVED %s %s %s'
+                           % (session.get_game_id(), start, end))
+            self.broadcast(session, session.state_line())
+        if writer in session.get_players():
+            await writer.drain()
+            return None
+        return 'MOVED %s %s %s' % (session.get_game_id(), start, end)
+
+
+async def serve(port=DEFAULT_PORT):
+    """Runs a server until it is interrupted."""
+    server = GameServer(port=port)
+    await server.start()
+    print('serving Janggi on port %d' % server.get_port())
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+def main(argv):
+    """Runs the server on the port given as the first argument."""
+    try:
+        asyncio.run(serve(int(argv[0]) if argv else DEFAULT_PORT))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
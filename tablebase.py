@@ -0,0 +1,388 @@
+# Description: Endgame tablebases for small sets of pieces, built by
+# retrograde analysis and probed through memory-mapped files. A material
+# set is written with the piece images of print_board(), such as 'GCguu'
+# for a red general and chariot against a blue general and two guards.
+# Build the tables for a set, and for every set a capture can lead to, with:
+#     python tablebase.py build GCguu tables/
+#
+# Each table holds one byte per position: whether the side to move wins,
+# loses or draws with best play, and in how many moves the game ends in
+# checkmate. A side that is not in check can always pass, so positions are
+# only lost by checkmate, and positions that are never decided are draws.
+
+import heapq
+import mmap
+import os
+import struct
+import sys
+from Janggi import JanggiGame, ArrayBoard, CODE_PIECES, FEN_CODES, PALACE, \
+    PIECE_CODES
+
+# File header: magic bytes, material set and number of positions.
+HEADER = struct.Struct('<8s16sQ')
+MAGIC = b'JANGGITB'
+EXTENSION = '.jtb'
+
+# Position bytes: 0 is a draw, WIN + n a win and LOSS + n a loss in n
+# moves (plies) to checkmate, and INVALID a placement that cannot occur.
+DRAW = 0
+WIN = 0
+LOSS = 127
+MAX_MOVES = 126
+INVALID = 255
+
+RED_GENERAL = PIECE_CODES['red', 'general']
+BLUE_GENERAL = PIECE_CODES['blue', 'general']
+
+# Square indices a piece can stand on: its own palace for generals and
+# guards, anywhere for the rest.
+PALACE_INDICES = {
+    'red': tuple(row * 9 + col for row, col in PALACE if row < 3),
+    'blue': tuple(row * 9 + col for row, col in PALACE if row > 6),
+}
+
+
+def piece_domain(code):
+    """Returns the tuple of square indices a piece code can stand on."""
+    piece = CODE_PIECES[code]
+    if piece.get_palace_only():
+        return PALACE_INDICES[piece.get_team()]
+    return tuple(range(90))
+
+
+class Material:
+    """A set of pieces and the numbering of its positions: whose turn it is,
+    then the square of each piece within the squares it can stand on."""
+
+    def __init__(self, material):
+        """
+        Initializes the material set.
+        :param material: String of piece images including both generals,
+        in any order, such as 'GCguu'.
+        """
+        try:
+            codes = sorted(FEN_CODES[image] for image in material)
+        except KeyError:
+            raise ValueError('bad material set %r' % material)
+        if codes.count(RED_GENERAL) != 1 or codes.count(BLUE_GENERAL) != 1:
+            raise ValueError('material set %r needs one general each'
+                             % material)
+        self._codes = tuple(codes)
+        self._name = ''.join(CODE_PIECES[code].get_image() for code in codes)
+        self._domains = [piece_domain(code) for code in codes]
+        self._places = [{index: place for place, index in enumerate(domain)}
+                        for domain in self._domains]
+        self._size = 2
+        for domain in self._domains:
+            self._size *= len(domain)
+        self._without = {}  # Captured piece code to the Material left
+
+    def get_name(self):
+        """Returns the material set in canonical order, such as 'GCguu'."""
+        return self._name
+
+    def get_codes(self):
+        """Returns the sorted tuple of piece codes."""
+        return self._codes
+
+    def get_size(self):
+        """Returns the number of positions, including invalid ones."""
+        return self._size
+
+    def without(self, code):
+        """Returns the Material left after a piece code is captured."""
+        if code not in self._without:
+            codes = list(self._codes)
+            codes.remove(code)
+            self._without[code] = Material(''.join(
+                CODE_PIECES[code].get_image() for code in codes))
+        return self._without[code]
+
+    def encode(self, cells, team):
+        """
+        Numbers a position of this material set.
+        :param cells: Sequence of 90 piece codes, as from get_position().
+        :param team: Team to move.
+        :return: Int position number, or None if a general or guard stands
+        outside its palace.
+        """
+        cells = bytes(cells)
+        number = 0
+        last_code = index = -1
+        for code, domain, places in zip(self._codes, self._domains,
+                                        self._places):
+            # Like pieces are numbered in square order
+            index = cells.index(code, index + 1 if code == last_code else 0)
+            last_code = code
+            place = places.get(index)
+            if place is None:
+                return None  # Not a square the piece can reach
+            number = number * len(domain) + place
+        return number * 2 + (team == 'blue')
+
+    def decode(self, number):
+        """
+        Rebuilds the position with a number.
+        :param number: Int position number.
+        :return: Tuple of a bytearray of 90 piece codes and the team to
+        move, or None if two pieces share a square or the number is not the
+        one encode() gives the position.
+        """
+        team = 'blue' if number & 1 else 'red'
+        number >>= 1
+        cells = bytearray(90)
+        last_code = last_index = None
+        for code, domain in zip(reversed(self._codes),
+                                reversed(self._domains)):
+            number, place = divmod(number, len(domain))
+            index = domain[place]
+            if cells[index]:
+                return None
+            if code == last_code and index > last_index:
+                return None  # Like pieces are numbered in square order
+            cells[index] = code
+            last_code, last_index = code, index
+        return cells, team
+
+
+def table_path(directory, material):
+    """Returns the file of a material set's table in a directory."""
+    return os.path.join(directory, material.get_name() + EXTENSION)
+
+
+def solve(material, sub_tables):
+    """
+    Solves every position of a material set by retrograde analysis: mated
+    positions are lost, positions with a move to a lost position are won,
+    and positions whose moves all reach won positions are lost, working
+    outward in order of moves to checkmate. A position with a winning move
+    is never lost, even if its other moves all reach won positions.
+    :param material: Material to solve.
+    :param sub_tables: Dict of material name to the solved bytes of every
+    set a capture leads to.
+    :return: Bytearray of one position byte per position number.
+    """
+    size = material.get_size()
+    values = bytearray([INVALID]) * size
+    remaining = [0] * size  # Moves not yet known to reach a won position
+    longest = [0] * size  # Most moves to mate among those won positions
+    parents = [None] * size  # Positions with a move to each position
+    winning = bytearray(size)  # 1 once a winning move is known
+    queue = []  # (moves to mate, position number, WIN or LOSS)
+    game = JanggiGame(ArrayBoard)  # Cheap get_position() and set_position()
+    for number in range(size):
+        position = material.decode(number)
+        if position is None:
+            continue
+        cells, team = position
+        other = 'red' if team == 'blue' else 'blue'
+        game.set_position(cells)
+        game.set_current_turn(team)
+        if game.is_general_attacked(other):
+            continue  # The last move left its own general in check
+        values[number] = DRAW
+        children = []
+        in_check = game.is_general_attacked(team)
+        if not in_check:
+            children.append(number ^ 1)  # Pass the turn
+        for start, end in game.pseudo_legal_moves(team):
+            captured = game.get_piece(end)
+            record = game.apply_move(start, end)
+            if game.is_general_attacked(team):
+                game.unmake_move(record)  # Leaves own general in check
+                continue
+            if captured is None:
+                children.append(material.encode(game.get_position(), other))
+            else:
+                sub_material = material.without(
+                    PIECE_CODES[captured.get_team(), captured.get_type()])
+                value = sub_tables[sub_material.get_name()][
+                    sub_material.encode(game.get_position(), other)]
+                if LOSS <= value < INVALID:  # The other side is mated
+                    heapq.heappush(queue, (value - LOSS + 1, number, WIN))
+                    winning[number] = 1
+                elif WIN < value < LOSS:
+                    longest[number] = max(longest[number], value - WIN)
+                else:
+                    remaining[number] += 1  # A draw, never resolved
+            game.unmake_move(record)
+        for child in children:
+            remaining[number] += 1
+            if parents[child] is None:
+                parents[child] = []
+            parents[child].append(number)
+        if remaining[number] == 0 and not winning[number]:
+            moves = longest[number] + 1 if longest[number] \
+                else 0  # Every move reaches a won position, or none exist
+            heapq.heappush(queue, (moves, number, LOSS))
+    propagate(values, queue, parents, remaining, longest, winning,
+              material.get_name())
+    return values
+
+
+def propagate(values, queue, parents, remaining, longest, winning, name):
+    """
+    Solves positions outward from those already known, in order of moves
+    to checkmate, for solve().
+    :param values: Bytearray of position bytes, DRAW for positions not yet
+    solved. Solved positions are written to it.
+    :param queue: Heap of (moves to mate, position number, WIN or LOSS).
+    :param parents: List of each position's parent position numbers, or
+    None.
+    :param remaining: List of each position's moves not yet known to reach
+    a won position, counting down.
+    :param longest: List of each position's most moves to mate among the
+    won positions its moves reach.
+    :param winning: Bytearray, 1 for positions with a known winning move.
+    :param name: Material name, for errors.
+    :return: None.
+    """
+    while queue:
+        moves, number, result = heapq.heappop(queue)
+        if values[number] != DRAW:
+            continue  # Already solved in fewer moves
+        if moves > MAX_MOVES:
+            raise ValueError('%s has a mate in more than %d moves'
+                             % (name, MAX_MOVES))
+        values[number] = (WIN if result == WIN else LOSS) + moves
+        for parent in parents[number] or ():
+            if values[parent] != DRAW:
+                continue
+            if result == LOSS:
+                heapq.heappush(queue, (moves + 1, parent, WIN))
+                winning[parent] = 1
+            else:
+                remaining[parent] -= 1
+                longest[parent] = max(longest[parent], moves)
+                if remaining[parent] == 0 and not winning[parent]:
+                    heapq.heappush(queue, (longest[parent] + 1, parent,
+                                           LOSS))
+
+
+def build_tables(material, directory, tables=None):
+    """
+    Solves a material set and every set a capture can lead to, writing
+    each table to a directory. Tables already in the directory are reused.
+    :param material: String of piece images, such as 'GCguu'.
+    :param directory: Directory to write the table files to.
+    :param tables: Dict of material name to solved bytes, filled in.
+    :return: Dict of material name to solved bytes.
+    """
+    if tables is None:
+        tables = {}
+    material = Material(material)
+    name = material.get_name()
+    if name in tables:
+        return tables
+    path = table_path(directory, material)
+    if os.path.exists(path):
+        with open(path, 'rb') as table_file:
+            tables[name] = table_file.read()[HEADER.size:]
+        return tables
+    for code in set(material.get_codes()) - {RED_GENERAL, BLUE_GENERAL}:
+        build_tables(material.without(code).get_name(), directory, tables)
+    values = solve(material, tables)
+    os.makedirs(directory, exist_ok=True)
+    with open(path + '.tmp', 'wb') as table_file:
+        table_file.write(HEADER.pack(MAGIC, name.encode(), len(values)))
+        table_file.write(values)
+    os.replace(path + '.tmp', path)  # Readers never see a partial table
+    tables[name] = bytes(values)
+    return tables
+
+
+class Tablebase:
+    """Probes the table files in a directory, memory-mapping each one the
+    first time a position of its material set is probed."""
+
+    def __init__(self, directory):
+        """
+        Finds the tables in a directory.
+        :param directory: Directory written by build_tables().
+        """
+        self._directory = directory
+        self._maps = {}  # Material name to (Material, mmap)
+        self._names = set()
+        self._max_pieces = 0
+        for file_name in os.listdir(directory):
+            if file_name.endswith(EXTENSION):
+                name = file_name[:-len(EXTENSION)]
+                self._names.add(name)
+                self._max_pieces = max(self._max_pieces, len(name))
+
+    def close(self):
+        """Unmaps every table file."""
+        for material, table_map in self._maps.values():
+            table_map.close()
+        self._maps.clear()
+
+    def get_max_pieces(self):
+        """Returns the most pieces on the board of any table."""
+        return self._max_pieces
+
+    def open_table(self, name):
+        """
+        Maps a table file.
+        :param name: Canonical material name, such as 'GCguu'.
+        :return: Tuple of Material and mmap.
+        """
+        material = Material(name)
+        with open(table_path(self._directory, material), 'rb') as table_file:
+            table_map = mmap.mmap(table_file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        magic, stored_name, size = HEADER.unpack_from(table_map, 0)
+        if magic != MAGIC or stored_name.rstrip(b'\0') != name.encode() or \
+                size != material.get_size() or \
+                len(table_map) != HEADER.size + size:
+            table_map.close()
+            raise ValueError('%s is not the %s table' % (
+                table_path(self._directory, material), name))
+        self._maps[name] = (material, table_map)
+        return material, table_map
+
+    def probe(self, game):
+        """
+        Looks up a game's position.
+        :param game: JanggiGame whose current player is to move.
+        :return: Tuple of 'WIN', 'LOSS' or 'DRAW' for the player to move
+        and the number of moves to checkmate (0 for a draw), or None if
+        there is no table for the position.
+        """
+        cells = game.get_position()
+        if 90 - cells.count(0) > self._max_pieces:
+            return None
+        name = ''.join(CODE_PIECES[code].get_image()
+                       for code in sorted(cells) if code)
+        if name not in self._names:
+            return None
+        material, table_map = self._maps.get(name) or self.open_table(name)
+        number = material.encode(cells, game.get_current_turn())
+        if number is None:
+            return None
+        value = table_map[HEADER.size + number]
+        if value == DRAW:
+            return 'DRAW', 0
+        if value < LOSS:
+            return 'WIN', value - WIN
+        if value < INVALID:
+            return 'LOSS', value - LOSS
+        return None  # Not a position that can be reached
+
+
+def main(argv):
+    """Builds tables: tablebase.py build GCguu tables/."""
+    if len(argv) != 3 or argv[0] != 'build':
+        print('usage: python tablebase.py build MATERIAL DIRECTORY')
+        return 2
+    for name, values in sorted(build_tables(argv[1], argv[2]).items()):
+        counts = [0, 0, 0]
+        for value in values:
+            if value != INVALID:
+                counts[0 if value == DRAW else 1 if value < LOSS else 2] += 1
+        print('%-10s %9d draws %9d wins %9d losses'
+              % (name, counts[0], counts[1], counts[2]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
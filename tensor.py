@@ -0,0 +1,100 @@
+# Description: Converts Janggi positions to and from NumPy arrays, and
+# computes statistics over many positions at once. Needs NumPy.
+#
+# A batch of N positions is an (N, 10, 9) int8 array of the piece codes of
+# Janggi.py: 0 for an empty square, PIECE_TYPES position plus one for a red
+# piece, plus BLUE_CODE for a blue piece.
+
+import numpy as np
+from Janggi import JanggiGame, ListBoard, PALACE, PIECE_CODES, PIECE_TYPES
+from evaluation import PIECE_VALUES
+
+# Material value of each piece code.
+CODE_VALUES = np.zeros(16, dtype=np.int32)
+for (_team, _type), _code in PIECE_CODES.items():
+    CODE_VALUES[_code] = PIECE_VALUES[_type]
+
+# True on the squares of both palaces.
+PALACE_MASK = np.zeros((10, 9), dtype=bool)
+for _row, _col in PALACE:
+    PALACE_MASK[_row, _col] = True
+
+TEAMS = ('red', 'blue')
+
+
+def games_to_array(games):
+    """
+    Stacks the boards of many games into one array.
+    :param games: Iterable of JanggiGame.
+    :return: (N, 10, 9) int8 array of piece codes.
+    """
+    data = b''.join(game.get_position() for game in games)
+    return np.frombuffer(data, dtype=np.int8).reshape(-1, 10, 9).copy()
+
+
+def game_to_array(game):
+    """Returns the (10, 9) int8 array of piece codes of one game."""
+    return games_to_array([game])[0]
+
+
+def array_to_games(positions, turns=None, board_class=ListBoard):
+    """
+    Builds a game for each position of an array.
+    :param positions: (N, 10, 9) or (10, 9) array of piece codes, with one
+    general of each team in every position.
+    :param turns: Optional sequence of the team to move in each position,
+    Blue by default.
+    :param board_class: Board core for the games.
+    :return: List of JanggiGame.
+    """
+    positions = np.asarray(positions, dtype=np.int8).reshape(-1, 90)
+    games = []
+    for number, cells in enumerate(positions):
+        game = JanggiGame(board_class, setup=False)
+        game.set_position(cells.astype(np.uint8).tobytes())
+        if turns is not None:
+            game.set_current_turn(turns[number])
+        games.append(game)
+    return games
+
+
+def piece_counts(positions):
+    """
+    Counts the pieces of each team and type in every position.
+    :param positions: (N, 10, 9) array of piece codes.
+    :return: (N, 2, 7) int array indexed by position, team (red, blue)
+    and type in PIECE_TYPES order.
+    """
+    positions = np.asarray(positions).reshape(-1, 90).astype(np.intp)
+    number = positions.shape[0]
+    offsets = np.arange(number, dtype=np.intp)[:, None] * 16
+    counts = np.bincount((positions + offsets).ravel(),
+                         minlength=16 * number).reshape(number, 16)
+    codes = np.array([[PIECE_CODES[team, piece_type]
+                       for piece_type in PIECE_TYPES] for team in TEAMS])
+    return counts[:, codes]
+
+
+def material(positions):
+    """
+    Sums the material of each team in every position.
+    :param positions: (N, 10, 9) array of piece codes.
+    :return: (N, 2) int array of red and blue material.
+    """
+    positions = np.asarray(positions).reshape(-1, 90)
+    values = CODE_VALUES[positions.astype(np.intp)]
+    blue = positions >= PIECE_CODES['blue', 'general']
+    return np.stack([np.where(blue, 0, values).sum(axis=1),
+                     np.where(blue, values, 0).sum(axis=1)], axis=1)
+
+
+def generals_in_palace(positions):
+    """
+    Tests whether each team's general stands on a palace square.
+    :param positions: (N, 10, 9) array of piece codes.
+    :return: (N, 2) bool array for red and blue.
+    """
+    positions = np.asarray(positions).reshape(-1, 10, 9)
+    return np.stack([((positions == PIECE_CODES[team, 'general']) &
+                      PALACE_MASK).any(axis=(1, 2)) for team in TEAMS],
+                    axis=1)
@@ -1,5 +1,42 @@
+import copy
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
 import unittest
-from Janggi import JanggiGame
+import asyncio
+import bench
+import book
+import evaluation
+import parallel_search
+import profiling
+import replay
+import search
+import server
+import tablebase
+import transposition
+from bitboard import BitBoard
+from Janggi import JanggiGame, ListBoard, ArrayBoard, MOVE_TABLES, Piece, \
+    MateCache, BETWEEN, PIECE_CODES, START_FEN, SQUARE_NAMES, parse_moves
+
+try:
+    import numpy
+    import tensor
+except ImportError:  # NumPy is only needed by tensor.py
+    numpy = None
+
+# Moves of test_a_checkmate_is_detected_correctly, ending in Red's checkmate.
+CHECKMATE_GAME = [('c7', 'c6'), ('c1', 'd3'), ('b10', 'd7'), ('b3', 'e3'),
+                  ('c10', 'd8'), ('h1', 'g3'), ('e7', 'e6'), ('e3', 'e6'),
+                  ('h8', 'c8'), ('d3', 'e5'), ('c8', 'c4'), ('e5', 'c4'),
+                  ('i10', 'i8'), ('g4', 'f4'), ('i8', 'f8'), ('g3', 'h5'),
+                  ('h10', 'g8'), ('e6', 'e3'), ('e9', 'd9'), ('c4', 'e5'),
+                  ('c6', 'd6'), ('e5', 'c4'), ('a7', 'a6'), ('h3', 'h9'),
+                  ('a10', 'a7'), ('c4', 'd6'), ('a6', 'b6'), ('h5', 'g7'),
+                  ('b8', 'b1'), ('a1', 'b1'), ('a7', 'a4'), ('b1', 'c1'),
+                  ('a4', 'a2'), ('e2', 'e1'), ('i7', 'h7'), ('c1', 'c9')]
 
 
 class TestJanggiGame(unittest.TestCase):
@@ -1883,5 +1920,1131 @@ class TestJanggiGame(unittest.TestCase):
                 "Game state should be RED_WON when the BLUE general is checkmated")
 
 
+class TestMakeUnmake(unittest.TestCase):
+    def test_unmake_move_restores_capture(self):
+        """MAKE/UNMAKE: test that undoing a capture restores both pieces"""
+        g = JanggiGame()
+        g.make_move('a7', 'a6')
+        g.make_move('i4', 'i5')
+        g.make_move('a6', 'a5')
+        g.make_move('i5', 'i6')
+        board = [list(row) for row in g.get_board()]
+        record = g.apply_move([4, 0], [3, 0])  # blue soldier captures
+        self.assertIs(record.get_captured(), board[3][0])
+        self.assertIsNone(g.get_piece([4, 0]))
+        g.unmake_move(record)
+        self.assertEqual(g.get_board(), board)
+
+    def test_unmake_move_restores_general_square(self):
+        """MAKE/UNMAKE: test that undoing a general move restores its square"""
+        g = JanggiGame()
+        record = g.apply_move([8, 4], [7, 4])
+        self.assertEqual(g.get_general_square('blue'), (7, 4))
+        g.unmake_move(record)
+        self.assertEqual(g.get_general_square('blue'), (8, 4))
+        self.assertEqual(g.get_piece([8, 4]).get_type(), 'general')
+
+    def test_rejected_pass_keeps_the_piece(self):
+        """MAKE/UNMAKE: test that a pass refused while in check leaves the
+        passing piece on the board"""
+        g = JanggiGame()
+        for start, end in CHECKMATE_GAME[:18]:  # Red cannon checks Blue
+            g.make_move(start, end)
+        self.assertIs(g.is_in_check('blue'), True)
+        self.assertIs(g.make_move('e9', 'e9'), False)
+        self.assertEqual(g.get_piece([8, 4]).get_type(), 'general')
+        self.assertIs(g.is_in_check('blue'), True)
+
+
+class TestArrayBoard(unittest.TestCase):
+    def test_starting_position_matches_list_board(self):
+        """ARRAY BOARD: test that both boards hold the same starting setup"""
+        list_game = JanggiGame()
+        array_game = JanggiGame(ArrayBoard)
+        self.assertEqual(array_game.get_position(), list_game.get_position())
+        self.assertEqual(len(array_game.get_position()), 90)
+
+    def test_checkmate_is_detected_on_array_board(self):
+        """ARRAY BOARD: test that a full game plays the same on both boards"""
+        list_game = JanggiGame(ListBoard)
+        array_game = JanggiGame(ArrayBoard)
+        for start, end in CHECKMATE_GAME:
+            self.assertIs(array_game.make_move(start, end),
+                          list_game.make_move(start, end))
+            self.assertEqual(array_game.get_position(),
+                             list_game.get_position())
+        self.assertEqual(array_game.get_game_state(), 'RED_WON')
+
+    def test_get_board_is_a_view(self):
+        """ARRAY BOARD: test that get_board() rows show the pieces but do
+        not change the board when edited"""
+        g = JanggiGame(ArrayBoard)
+        rows = g.get_board()
+        self.assertEqual(rows[8][4].get_image(), 'g')
+        rows[8][4] = None
+        self.assertEqual(g.get_piece([8, 4]).get_type(), 'general')
+
+    def test_copy_is_independent(self):
+        """ARRAY BOARD: test that a copied board does not share cells"""
+        board = ArrayBoard()
+        board.set_piece([0, 0], JanggiGame().get_piece([0, 0]))
+        copy = board.copy()
+        board.set_piece([0, 0], None)
+        self.assertEqual(copy.get_piece([0, 0]).get_type(), 'chariot')
+        self.assertIsNone(board.get_piece([0, 0]))
+
+
+class TestMoveTables(unittest.TestCase):
+    def test_horse_table_lists_blocking_square(self):
+        """MOVE TABLES: test that a horse move lists its blocking square"""
+        moves = MOVE_TABLES['blue', 'horse'][9 * 9 + 2]  # Horse on c10
+        self.assertEqual(moves[7 * 9 + 3], ((8, 2),))  # c10 to d8
+        self.assertEqual(moves[9 * 9 + 2], ())  # Passing the turn
+        self.assertNotIn(10 * 9 + 3, moves)  # Off the board
+
+    def test_general_table_stays_in_palace(self):
+        """MOVE TABLES: test that general moves never leave the palace"""
+        moves = MOVE_TABLES['red', 'general'][2 * 9 + 3]  # General on d3
+        self.assertEqual(sorted(moves),
+                         [1 * 9 + 3, 1 * 9 + 4, 2 * 9 + 3, 2 * 9 + 4])
+
+    def test_chariot_is_blocked_next_to_its_destination(self):
+        """MOVE TABLES: test that a chariot cannot jump a piece standing
+        right before its destination"""
+        g = JanggiGame()
+        g.make_move('a7', 'a7')  # Blue passes
+        self.assertIs(g.make_move('a1', 'a5'), False)  # Soldier on a4
+        self.assertIs(g.make_move('a1', 'a3'), True)
+
+
+def generals_only_game():
+    """Returns a JanggiGame with only the two generals on the board."""
+    g = JanggiGame()
+    g.set_whole_board([[None] * 9 for row in range(10)])
+    g.set_board(Piece('red', 'general', 'G'), [1, 4])
+    g.set_board(Piece('blue', 'general', 'g'), [8, 4])
+    return g
+
+
+class TestLegalMoves(unittest.TestCase):
+    def test_starting_moves(self):
+        """LEGAL MOVES: test the number of moves in the starting setup"""
+        g = JanggiGame()
+        moves = list(g.legal_moves('blue'))
+        self.assertEqual(len(moves), len(list(g.legal_moves('red'))))
+        self.assertIn(((6, 2), (5, 2)), moves)  # Soldier c7 to c6
+        self.assertNotIn(((9, 0), (6, 0)), moves)  # Chariot blocked by a7
+        for start, end in moves:
+            self.assertNotEqual(start, end)
+
+    def test_moves_in_check_escape_the_check(self):
+        """LEGAL MOVES: test that every move of a checked player escapes"""
+        g = JanggiGame()
+        for start, end in CHECKMATE_GAME[:18]:  # Red cannon checks Blue
+            g.make_move(start, end)
+        moves = list(g.legal_moves('blue'))
+        self.assertTrue(moves)
+        for start, end in moves:
+            record = g.apply_move(start, end)
+            self.assertIs(g.is_general_attacked('blue'), False)
+            g.unmake_move(record)
+
+    def test_no_moves_after_checkmate(self):
+        """LEGAL MOVES: test that a checkmated player has no moves"""
+        g = JanggiGame()
+        for start, end in CHECKMATE_GAME:
+            g.make_move(start, end)
+        self.assertEqual(list(g.legal_moves('blue')), [])
+
+    def test_escape_that_gives_check_is_not_checkmate(self):
+        """LEGAL MOVES: test that capturing the checking piece while
+        checking the other general escapes checkmate"""
+        g = generals_only_game()
+        g.set_board(Piece('red', 'chariot', 'C'), [5, 3])
+        g.set_board(Piece('blue', 'chariot', 'c'), [5, 0])
+        for square in ([7, 3], [8, 3], [9, 3], [7, 5], [8, 5], [9, 5]):
+            g.set_board(Piece('blue', 'elephant', 'e'), square)
+        g.set_current_turn('red')
+        self.assertIs(g.make_move('d6', 'e6'), True)  # Red checks Blue
+        self.assertIs(g.is_in_check('blue'), True)
+        self.assertEqual(g.get_game_state(), 'UNFINISHED')
+        self.assertEqual(list(g.legal_moves('blue')), [((5, 0), (5, 4))])
+        self.assertIs(g.make_move('a6', 'e6'), True)
+        self.assertIs(g.is_in_check('red'), True)
+
+
+class TestCheckDetection(unittest.TestCase):
+    def test_chariot_check_is_blocked(self):
+        """CHECK DETECTION: test a chariot check and its blocking piece"""
+        g = generals_only_game()
+        g.set_board(Piece('red', 'chariot', 'C'), [4, 4])
+        self.assertIs(g.is_general_attacked('blue'), True)
+        g.set_board(Piece('blue', 'soldier', 's'), [6, 4])
+        self.assertIs(g.is_general_attacked('blue'), False)
+
+    def test_cannon_needs_one_screen_that_is_not_a_cannon(self):
+        """CHECK DETECTION: test cannon checks over zero, one and two
+        screens, and over another cannon"""
+        g = generals_only_game()
+        g.set_board(Piece('red', 'cannon', 'N'), [4, 4])
+        self.assertIs(g.is_general_attacked('blue'), False)
+        g.set_board(Piece('blue', 'soldier', 's'), [6, 4])
+        self.assertIs(g.is_general_attacked('blue'), True)
+        g.set_board(Piece('red', 'soldier', 'S'), [5, 4])
+        self.assertIs(g.is_general_attacked('blue'), False)
+        g.set_board(None, [5, 4])
+        g.set_board(Piece('blue', 'cannon', 'n'), [6, 4])
+        self.assertIs(g.is_general_attacked('blue'), False)
+
+    def test_horse_check_is_blocked_by_its_leg(self):
+        """CHECK DETECTION: test a horse check and its blocking square"""
+        g = generals_only_game()
+        g.set_board(Piece('red', 'horse', 'H'), [6, 3])  # d7 to e9
+        self.assertIs(g.is_general_attacked('blue'), True)
+        g.set_board(Piece('blue', 'guard', 'u'), [7, 3])
+        self.assertIs(g.is_general_attacked('blue'), False)
+
+    def test_soldier_checks_forward_and_sideways_only(self):
+        """CHECK DETECTION: test that a soldier checks by its own moves"""
+        g = generals_only_game()
+        g.set_board(Piece('red', 'soldier', 'S'), [8, 3])
+        self.assertIs(g.is_general_attacked('blue'), True)
+        g.set_board(None, [8, 3])
+        g.set_board(Piece('red', 'soldier', 'S'), [9, 4])  # Behind general
+        self.assertIs(g.is_general_attacked('blue'), False)
+        self.assertIs(g.is_general_attacked('red'), False)
+
+
+class TestAttackMaps(unittest.TestCase):
+    def test_attack_counts_along_a_line(self):
+        """ATTACK MAPS: test the counts of a chariot and a cannon screened
+        by it as the piece in front of them comes and goes"""
+        g = generals_only_game()
+        g.set_board(Piece('red', 'chariot', 'C'), [4, 4])
+        g.set_board(Piece('red', 'cannon', 'N'), [3, 4])
+        g.set_board(Piece('blue', 'soldier', 's'), [6, 4])
+        self.assertEqual(g.count_attackers('red', [5, 4]), 2)
+        self.assertEqual(g.count_attackers('red', [6, 4]), 2)
+        self.assertEqual(g.count_attackers('red', [7, 4]), 0)
+        self.assertEqual(g.count_attackers('blue', [5, 4]), 1)
+        g.set_board(None, [6, 4])
+        self.assertEqual(g.count_attackers('red', [8, 4]), 2)
+        self.assertEqual(g.count_attackers('blue', [5, 4]), 0)
+        self.assertIs(g.is_general_attacked('blue'), True)
+
+    def test_attack_counts_of_a_blocked_horse(self):
+        """ATTACK MAPS: test that a piece on a horse's leg removes its
+        attacks past it"""
+        g = generals_only_game()
+        g.set_board(Piece('red', 'horse', 'H'), [6, 3])
+        self.assertEqual(g.count_attackers('red', [8, 4]), 1)
+        self.assertEqual(g.count_attackers('red', [8, 2]), 1)
+        g.set_board(Piece('blue', 'guard', 'u'), [7, 3])
+        self.assertEqual(g.count_attackers('red', [8, 4]), 0)
+        self.assertEqual(g.count_attackers('red', [8, 2]), 0)
+        self.assertEqual(g.count_attackers('red', [4, 2]), 1)
+
+    def test_incremental_attacks_match_a_recount(self):
+        """ATTACK MAPS: test that the counts kept through moves and undos
+        equal counts made from scratch, on every board core, and that check
+        tests agree with and without them"""
+        for board_class in (ListBoard, ArrayBoard, BitBoard):
+            g = JanggiGame(board_class)
+            for start, end in CHECKMATE_GAME:
+                team = g.get_current_turn()
+                before = (list(g.get_attacks('red')),
+                          list(g.get_attacks('blue')))
+                for move in g.pseudo_legal_moves(team)[:10]:
+                    record = g.apply_move(*move)
+                    fresh = JanggiGame(board_class)
+                    fresh.set_position(g.get_position())
+                    for side in ('red', 'blue'):
+                        self.assertEqual(g.get_attacks(side),
+                                         fresh.get_attacks(side))
+                        self.assertEqual(  # Ray probe without the maps
+                            g.is_general_attacked(side),
+                            JanggiGame.from_fen(g.to_fen()).
+                            is_general_attacked(side))
+                    g.unmake_move(record)
+                    self.assertEqual((g.get_attacks('red'),
+                                      g.get_attacks('blue')), before)
+                self.assertIs(g.make_move(start, end), True)
+
+
+class TestPerft(unittest.TestCase):
+    def test_perft_matches_recorded_node_counts(self):
+        """PERFT: test node counts of the benchmark positions to depth 2"""
+        for name, counts in bench.PERFT_RESULTS.items():
+            g = bench.setup_position(name)
+            for depth in range(3):
+                self.assertEqual(g.perft(depth), counts[depth], name)
+
+    def test_perft_restores_the_position(self):
+        """PERFT: test that perft leaves the board and turn unchanged"""
+        g = bench.setup_position('check')
+        position = g.get_position()
+        g.perft(2)
+        self.assertEqual(g.get_position(), position)
+        self.assertEqual(g.get_current_turn(), 'blue')
+        self.assertIs(g.is_in_check('blue'), True)
+
+
+class TestImport(unittest.TestCase):
+    def test_rules_engine_does_not_import_pygame(self):
+        """IMPORT: test that importing Janggi leaves pygame unloaded"""
+        seconds, pygame_loaded = bench.time_import()
+        self.assertIs(pygame_loaded, False)
+
+
+class TestZobristHash(unittest.TestCase):
+    def test_hash_is_updated_incrementally(self):
+        """ZOBRIST: test that the kept hash matches a full recomputation"""
+        g = JanggiGame()
+        self.assertEqual(g.get_hash(), g.compute_hash())
+        for start, end in CHECKMATE_GAME:
+            g.make_move(start, end)
+            self.assertEqual(g.get_hash(), g.compute_hash())
+
+    def test_transposed_moves_reach_the_same_hash(self):
+        """ZOBRIST: test that move order does not change the hash"""
+        first = JanggiGame()
+        second = JanggiGame(ArrayBoard)
+        for start, end in [('a7', 'a6'), ('a4', 'a5'), ('i7', 'i6')]:
+            first.make_move(start, end)
+        for start, end in [('i7', 'i6'), ('a4', 'a5'), ('a7', 'a6')]:
+            second.make_move(start, end)
+        self.assertEqual(first.get_hash(), second.get_hash())
+        self.assertNotEqual(first.get_hash(), JanggiGame().get_hash())
+
+    def test_turn_and_unmake_restore_the_hash(self):
+        """ZOBRIST: test that the turn is hashed and unmake restores it"""
+        g = JanggiGame()
+        start_hash = g.get_hash()
+        g.set_current_turn('red')
+        self.assertNotEqual(g.get_hash(), start_hash)
+        g.set_current_turn('blue')
+        record = g.apply_move([9, 0], [7, 0])
+        self.assertNotEqual(g.get_hash(), start_hash)
+        g.unmake_move(record)
+        self.assertEqual(g.get_hash(), start_hash)
+
+
+class TestMateCache(unittest.TestCase):
+    def test_replayed_game_hits_the_cache(self):
+        """MATE CACHE: test that replaying a game reuses mate verdicts"""
+        cache = MateCache()
+        for _ in range(2):
+            g = JanggiGame(mate_cache=cache)
+            for start, end in CHECKMATE_GAME:
+                g.make_move(start, end)
+            self.assertEqual(g.get_game_state(), 'RED_WON')
+        stats = cache.get_stats()
+        self.assertEqual(stats['misses'], stats['size'])
+        self.assertEqual(stats['hits'], stats['misses'])
+        self.assertGreater(stats['hits'], 0)
+
+    def test_cache_drops_least_recently_used(self):
+        """MATE CACHE: test that a full cache drops its oldest verdict"""
+        cache = MateCache(max_size=2)
+        cache.store('a', True)
+        cache.store('b', False)
+        self.assertIs(cache.lookup('a'), True)
+        cache.store('c', True)
+        self.assertIsNone(cache.lookup('b'))
+        self.assertIs(cache.lookup('c'), True)
+        self.assertEqual(cache.get_hits(), 2)
+        self.assertEqual(cache.get_misses(), 1)
+
+
+class TestCaptureMoves(unittest.TestCase):
+    def test_captures_match_pseudo_legal_captures(self):
+        """CAPTURE MOVES: test the capture generator against the full
+        generator along a game"""
+        g = JanggiGame()
+        for start, end in CHECKMATE_GAME:
+            for team in ('red', 'blue'):
+                captures = [move for move in g.pseudo_legal_moves(team)
+                            if g.get_piece(move[1]) is not None]
+                self.assertEqual(sorted(g.capture_moves(team)),
+                                 sorted(captures))
+            g.make_move(start, end)
+
+
+class TestSearch(unittest.TestCase):
+    def test_search_finds_checkmate_in_one(self):
+        """SEARCH: test that the search finds a mating move"""
+        g = JanggiGame()
+        for start, end in CHECKMATE_GAME[:-1]:
+            g.make_move(start, end)
+        position = g.get_position()
+        result = search.Searcher(g).search(max_depth=3)
+        self.assertEqual(g.get_position(), position)
+        self.assertEqual(result.get_score(), search.MATE_SCORE - 1)
+        self.assertEqual(len(result.get_pv()), 1)
+        start, end = search.find_best_move(g, max_depth=2)
+        self.assertIs(g.make_move(start, end), True)
+        self.assertEqual(g.get_game_state(), 'RED_WON')
+
+    def test_search_captures_a_free_chariot(self):
+        """SEARCH: test that an undefended chariot is captured"""
+        g = generals_only_game()
+        g.set_board(Piece('blue', 'chariot', 'c'), [5, 0])
+        g.set_board(Piece('red', 'horse', 'H'), [3, 1])
+        g.set_current_turn('red')
+        result = search.Searcher(g).search(max_depth=2)
+        self.assertEqual(result.get_move(), ((3, 1), (5, 0)))
+        self.assertEqual(result.get_pv()[0], result.get_move())
+
+    def test_quiescence_sees_the_recapture(self):
+        """SEARCH: test that a defended soldier is not taken with a chariot
+        at depth 1, because quiescence sees the recapture"""
+        g = generals_only_game()
+        g.set_board(Piece('red', 'chariot', 'C'), [3, 0])
+        g.set_board(Piece('blue', 'soldier', 's'), [6, 0])
+        g.set_board(Piece('blue', 'chariot', 'c'), [6, 8])
+        g.set_current_turn('red')
+        searcher = search.Searcher(g)
+        record = g.apply_move([3, 0], [6, 0])
+        g.set_current_turn('blue')
+        self.assertLess(g.evaluate(), 0)  # Blue is a soldier down
+        self.assertGreater(searcher.quiesce(-search.INFINITY,
+                                            search.INFINITY, 0,
+                                            search.QUIESCENCE_DEPTH),
+                           search.PIECE_VALUES['chariot'] // 2)
+        g.set_current_turn('red')
+        g.unmake_move(record)
+        result = searcher.search(max_depth=1)
+        self.assertNotEqual(result.get_move(), ([3, 0], [6, 0]))
+
+    def test_search_stops_at_time_limit(self):
+        """SEARCH: test that iterative deepening keeps the last finished
+        depth when the time budget runs out"""
+        g = JanggiGame()
+        result = search.Searcher(g).search(time_limit=0.2)
+        self.assertGreaterEqual(result.get_depth(), 1)
+        self.assertLess(result.get_seconds(), 0.2)
+        self.assertIsNotNone(result.get_move())
+        self.assertEqual(g.get_position(), JanggiGame().get_position())
+
+    def test_search_finishes_depth_one_without_time(self):
+        """SEARCH: test that a search with no time left still returns a
+        move when there is one"""
+        g = bench.setup_position('midgame')
+        result = search.Searcher(g).search(time_limit=0.0)
+        self.assertGreaterEqual(result.get_depth(), 1)
+        self.assertIsNotNone(result.get_move())
+        self.assertIsNotNone(search.find_best_move(g, time_limit=0.0))
+
+    def test_search_move_scores_one_root_move(self):
+        """SEARCH: test that search_move() scores a move like the root of
+        search() and turns down a move into check"""
+        g = bench.setup_position('midgame')
+        searcher = search.Searcher(g)
+        result = searcher.search(max_depth=2)
+        score, pv = searcher.search_move(result.get_move(), 2)
+        self.assertEqual(score, result.get_score())
+        self.assertEqual(pv[0], result.get_move())
+        g = bench.setup_position('check')
+        self.assertIsNone(search.Searcher(g).search_move(([9, 0], [8, 0]),
+                                                         1))
+
+
+class TestParallelSearch(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.searcher = parallel_search.ParallelSearcher(workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.searcher.close()
+
+    def test_parallel_search_finds_checkmate_in_one(self):
+        """PARALLEL: test that the workers find a mating move"""
+        g = JanggiGame()
+        for start, end in CHECKMATE_GAME[:-1]:
+            g.make_move(start, end)
+        position = g.get_position()
+        result = self.searcher.search(g, max_depth=3)
+        self.assertEqual(g.get_position(), position)
+        self.assertEqual(result.get_score(), search.MATE_SCORE - 1)
+        self.assertEqual(result.get_depth(), 1)
+
+    def test_parallel_search_matches_sequential_search(self):
+        """PARALLEL: test that splitting the root moves gives the score of
+        the sequential search"""
+        for name in ('opening', 'late'):
+            g = bench.setup_position(name)
+            for depth in (1, 2):
+                self.assertEqual(
+                    self.searcher.search(g, depth).get_score(),
+                    search.Searcher(g).search(depth).get_score())
+
+    def test_parallel_search_always_returns_a_move(self):
+        """PARALLEL: test that a search out of time still gives a move"""
+        g = bench.setup_position('opening')
+        move = self.searcher.search(g, time_limit=0.0).get_move()
+        self.assertIn(move, list(g.legal_moves(g.get_current_turn())))
+
+
+class TestTranspositionTable(unittest.TestCase):
+    def setUp(self):
+        self.table = transposition.SharedTranspositionTable(1000)
+        self.addCleanup(self.table.close)
+
+    def test_store_and_probe(self):
+        """TRANSPOSITION: test that an entry is read back, and that a
+        shallower result does not replace a deeper one"""
+        self.assertEqual(self.table.get_entries(), 512)
+        key = JanggiGame().get_hash()
+        self.assertIsNone(self.table.probe(key))
+        self.table.store(key, 3, transposition.LOWER, -250,
+                         ([0, 1], [2, 2]))
+        self.assertEqual(self.table.probe(key),
+                         (3, transposition.LOWER, -250, (1, 20)))
+        self.table.store(key, 2, transposition.EXACT, 40)
+        self.assertEqual(self.table.probe(key)[0], 3)
+        self.table.store(key, 4, transposition.EXACT, 40)
+        self.assertEqual(self.table.probe(key),
+                         (4, transposition.EXACT, 40, None))
+        self.assertIsNone(self.table.probe(key ^ (1 << 40)))
+
+    def test_torn_entry_is_ignored(self):
+        """TRANSPOSITION: test that an entry whose words were written by
+        different stores does not match"""
+        key = JanggiGame().get_hash()
+        self.table.store(key, 3, transposition.EXACT, 100)
+        offset = (key & 511) * transposition.ENTRY.size + 8
+        self.table._memory.buf[offset] ^= 1
+        self.assertIsNone(self.table.probe(key))
+
+    def test_pickled_table_shares_memory(self):
+        """TRANSPOSITION: test that an unpickled table attaches to the same
+        block"""
+        copy_table = pickle.loads(pickle.dumps(self.table))
+        self.addCleanup(copy_table.close)
+        self.assertEqual(copy_table.get_name(), self.table.get_name())
+        copy_table.store(12345, 5, transposition.UPPER, 7)
+        self.assertEqual(self.table.probe(12345),
+                         (5, transposition.UPPER, 7, None))
+
+    def test_search_with_table(self):
+        """TRANSPOSITION: test that searches sharing a table score like a
+        search without one, that workers can share it, and that mates are
+        still found"""
+        g = bench.setup_position('late')
+        score = search.Searcher(g).search(3).get_score()
+        self.assertEqual(
+            search.Searcher(g, table=self.table).search(3).get_score(), score)
+        self.assertEqual(
+            search.Searcher(g, table=self.table).search(3).get_score(), score)
+        with parallel_search.ParallelSearcher(2, self.table) as searcher:
+            result = searcher.search(g, 3)  # Worker timing decides stores
+        self.assertEqual(result.get_depth(), 3)
+        self.assertIsNotNone(result.get_move())
+        g = JanggiGame()
+        for start, end in CHECKMATE_GAME[:-1]:
+            g.make_move(start, end)
+        result = search.Searcher(g, table=self.table).search(max_depth=3)
+        self.assertEqual(result.get_score(), search.MATE_SCORE - 1)
+
+
+class TestEvaluation(unittest.TestCase):
+    def test_starting_setup_is_even(self):
+        """EVALUATION: test that the mirrored starting setup scores 0"""
+        g = JanggiGame()
+        self.assertEqual(g.get_score(), 0)
+        self.assertEqual(g.evaluate(), 0)
+
+    def test_score_is_kept_up_to_date(self):
+        """EVALUATION: test the incremental score against a full count
+        through a game and back, on every board core"""
+        for board_class in (ListBoard, ArrayBoard, BitBoard):
+            g = JanggiGame(board_class)
+            for start, end in CHECKMATE_GAME:
+                g.make_move(start, end)
+                self.assertEqual(g.get_score(), g.compute_score())
+            red_to_move = g.evaluate()
+            g.set_current_turn('red')
+            self.assertEqual(g.evaluate(), -red_to_move)
+            self.assertEqual(g.evaluate(), g.get_score())
+            for start, end in g.pseudo_legal_moves('red'):
+                record = g.apply_move(start, end)
+                self.assertEqual(g.get_score(), g.compute_score())
+                g.unmake_move(record)
+            self.assertEqual(g.get_score(), g.compute_score())
+
+    def test_square_scores(self):
+        """EVALUATION: test material and square bonuses of one piece"""
+        red = evaluation.square_scores('red', 'soldier')
+        blue = evaluation.square_scores('blue', 'soldier')
+        self.assertEqual(red[3 * 9 + 0], 200)
+        self.assertEqual(red[6 * 9 + 4], 240)
+        self.assertEqual(blue[3 * 9 + 4], -240)
+        for index in range(90):
+            row, col = divmod(index, 9)
+            self.assertEqual(blue[(9 - row) * 9 + col], -red[index])
+
+
+class TestOpeningBook(unittest.TestCase):
+    def setUp(self):
+        """Builds a book from three games in a temporary directory."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'book.bin')
+        games = [CHECKMATE_GAME, CHECKMATE_GAME[:3] + [('h1', 'g3')],
+                 'a7a6 a4a5']
+        self.records = book.build_book(games, self.path, plies=4)
+
+    def test_lookup_counts_moves(self):
+        """BOOK: test the moves and counts stored for positions"""
+        self.assertEqual(self.records, 7)
+        with book.OpeningBook(self.path) as opening_book:
+            self.assertEqual(opening_book.get_size(), 7)
+            g = JanggiGame()
+            self.assertEqual(opening_book.lookup(g.get_hash()),
+                             [((6, 2), (5, 2), 2), ((6, 0), (5, 0), 1)])
+            self.assertEqual(opening_book.best_move(g), ((6, 2), (5, 2)))
+            for start, end in CHECKMATE_GAME[:3]:
+                g.make_move(start, end)
+            self.assertEqual(len(opening_book.get_moves(g)), 2)
+            g.make_move('h1', 'g3')
+            self.assertEqual(opening_book.lookup(g.get_hash()), [])
+            self.assertIsNone(opening_book.best_move(g))
+
+    def test_unreadable_moves_end_their_game(self):
+        """BOOK: test that a game stops counting at a move that cannot be
+        read, without stopping the other games"""
+        counts = book.count_book_moves(['a7a6 zz9 a4a5',
+                                        [('a7', 'a6'), ('q1', 'a2')],
+                                        [('a7', 'a6'), ('a4',)],
+                                        'a7a6 a4a5'])
+        key = JanggiGame().get_hash()
+        self.assertEqual(counts[key, 54, 45], 4)
+        self.assertEqual(sum(counts.values()), 5)
+
+    def test_search_plays_book_moves(self):
+        """BOOK: test that find_best_move() plays from the book"""
+        with book.OpeningBook(self.path) as opening_book:
+            self.assertEqual(search.find_best_move(JanggiGame(), max_depth=1,
+                                                   book=opening_book),
+                             ('c7', 'c6'))
+
+    def test_other_files_are_refused(self):
+        """BOOK: test that a file that is not a book is refused"""
+        with open(self.path, 'ab') as book_file:
+            book_file.write(b'x')
+        with self.assertRaises(ValueError):
+            book.OpeningBook(self.path)
+
+
+class TestTablebase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Builds the chariot against lone general tables once."""
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.tables = tablebase.build_tables('GgC', cls.directory.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_material_numbering(self):
+        """TABLEBASE: test that position numbers round trip"""
+        material = tablebase.Material('gCGC')
+        self.assertEqual(material.get_name(), 'GCCg')
+        self.assertEqual(material.get_size(), 2 * 9 * 9 * 90 * 90)
+        g = JanggiGame.from_fen('4G4/9/9/9/C8/9/9/4g4/9/8C r -')
+        number = material.encode(g.get_position(), 'red')
+        self.assertEqual(material.decode(number),
+                         (bytearray(g.get_position()), 'red'))
+        self.assertEqual(material.encode(g.get_position(), 'blue'),
+                         number + 1)
+        with self.assertRaises(ValueError):
+            tablebase.Material('GCC')
+
+    def test_tables_are_written_for_captures(self):
+        """TABLEBASE: test that the tables a capture leads to are built"""
+        self.assertEqual(set(self.tables), {'GCg', 'Gg'})
+        self.assertEqual(sorted(os.listdir(self.directory.name)),
+                         ['GCg.jtb', 'Gg.jtb'])
+        values = self.tables['GCg']
+        self.assertEqual(len(values), tablebase.Material('GCg').get_size())
+        self.assertEqual(set(values), {tablebase.DRAW, tablebase.INVALID})
+
+    def test_values_follow_from_the_moves(self):
+        """TABLEBASE: test every solved position against the values its
+        moves reach, with a sub-table where every position is lost, so that
+        Blue wins by taking the chariot"""
+        material = tablebase.Material('GCg')
+        lost = tablebase.LOSS + 5
+        values = tablebase.solve(material, {
+            'Gg': bytes([lost]) * tablebase.Material('Gg').get_size()})
+        self.assertIn(tablebase.WIN + 6, values)
+        g = JanggiGame(ArrayBoard)
+        for number, value in enumerate(values):
+            if value == tablebase.INVALID:
+                continue
+            cells, team = material.decode(number)
+            other = 'red' if team == 'blue' else 'blue'
+            g.set_position(cells)
+            g.set_current_turn(team)
+            reached = []
+            if not g.is_general_attacked(team):
+                reached.append(values[number ^ 1])  # Pass
+            for start, end in g.pseudo_legal_moves(team):
+                captured = g.get_piece(end)
+                record = g.apply_move(start, end)
+                if not g.is_general_attacked(team):
+                    reached.append(lost if captured is not None else values[
+                        material.encode(g.get_position(), other)])
+                g.unmake_move(record)
+            losses = [moves - tablebase.LOSS for moves in reached
+                      if moves >= tablebase.LOSS]
+            wins = [moves - tablebase.WIN for moves in reached
+                    if tablebase.WIN < moves < tablebase.LOSS]
+            if losses:
+                expected = tablebase.WIN + min(losses) + 1
+            elif len(wins) == len(reached):
+                expected = tablebase.LOSS + (max(wins) + 1 if wins else 0)
+            else:
+                expected = tablebase.DRAW
+            self.assertEqual(value, expected, g.to_fen())
+
+    def test_winning_move_is_never_lost(self):
+        """TABLEBASE: test that a position with a winning capture in 6 is not
+        stored as lost when its only other move reaches a position won
+        sooner"""
+        values = bytearray([tablebase.DRAW] * 3)
+        queue = [(0, 2, tablebase.LOSS),  # 2 is mated
+                 (6, 0, tablebase.WIN)]  # 0 captures into a mate in 5
+        tablebase.propagate(values, queue, [None, [0], [1]], [1, 1, 0],
+                            [0, 0, 0], bytearray([1, 0, 0]), 'test')
+        self.assertEqual(list(values), [tablebase.WIN + 6, tablebase.WIN + 1,
+                                        tablebase.LOSS])
+
+    def test_probe(self):
+        """TABLEBASE: test probing positions with and without tables"""
+        probe = tablebase.Tablebase(self.directory.name)
+        self.addCleanup(probe.close)
+        self.assertEqual(probe.get_max_pieces(), 3)
+        self.assertIsNone(probe.probe(JanggiGame()))
+        g = JanggiGame.from_fen('4G4/9/9/9/9/9/9/4g4/9/C8 b -')
+        self.assertEqual(probe.probe(g), ('DRAW', 0))
+        g = JanggiGame.from_fen('4G4/9/9/9/9/9/9/4g4/9/4C4 r b')
+        self.assertIsNone(probe.probe(g))  # Blue cannot be left in check
+        g = JanggiGame.from_fen('9/9/9/9/4G4/9/9/4g4/9/C8 b -')
+        self.assertIsNone(probe.probe(g))  # Red general out of its palace
+        self.assertIsNone(tablebase.Material('GCg').encode(
+            g.get_position(), 'blue'))
+        self.assertEqual(search.Searcher(g, probe).tablebase_score(
+            ('LOSS', 2), 3), -search.MATE_SCORE + 5)
+
+
+class TestServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        """Starts a server on a free port."""
+        self.server = server.GameServer(port=0, engine_workers=1)
+        await self.server.start()
+        self.addAsyncCleanup(self.server.close)
+
+    async def connect(self):
+        """Opens a client connection, closed after the test."""
+        reader, writer = await asyncio.open_connection(
+            '127.0.0.1', self.server.get_port())
+        self.addCleanup(writer.close)
+        return reader, writer
+
+    async def request(self, client, line):
+        """Sends a line and returns the first line received."""
+        client[1].write(line.encode() + b'\n')
+        return await self.receive(client)
+
+    async def receive(self, client):
+        """Returns the next line received."""
+        line = await asyncio.wait_for(client[0].readline(), 10)
+        return line.decode().rstrip('\n')
+
+    async def test_moves_are_pushed_to_players(self):
+        """SERVER: test that a move is validated and sent to both players"""
+        blue = await self.connect()
+        red = await self.connect()
+        self.assertEqual(await self.request(blue, 'NEW'), 'GAME 1')
+        self.assertEqual(await self.receive(blue),
+                         'STATE 1 UNFINISHED ' + START_FEN)
+        self.assertEqual(await self.request(red, 'JOIN 1'),
+                         'STATE 1 UNFINISHED ' + START_FEN)
+        self.assertEqual(await self.request(red, 'MOVE 1 a1 a2'),
+                         'ILLEGAL 1 a1 a2')  # Blue moves first
+        self.assertEqual(await self.request(red, 'MOVE 1 z9 a2'),
+                         'ILLEGAL 1 z9 a2')
+        self.assertEqual(await self.request(blue, 'MOVE 1 c7 c6'),
+                         'MOVED 1 c7 c6')
+        for client in (blue, red):
+            if client is red:
+                self.assertEqual(await self.receive(red), 'MOVED 1 c7 c6')
+            state = await self.receive(client)
+            self.assertTrue(state.startswith('STATE 1 UNFINISHED '))
+            self.assertTrue(state.endswith(' r -'))
+        game = self.server.get_session('1').get_game()
+        self.assertEqual(game.get_current_turn(), 'red')
+
+    async def test_engine_moves_in_a_worker_process(self):
+        """SERVER: test that the engine answers for the player to move"""
+        client = await self.connect()
+        await self.request(client, 'NEW')
+        await self.receive(client)
+        moved = await self.request(client, 'ENGINE 1 0.05')
+        self.assertTrue(moved.startswith('MOVED 1 '))
+        self.assertTrue((await self.receive(client)).endswith(' r -'))
+
+    async def test_engine_move_is_not_played_on_a_changed_game(self):
+        """SERVER: test that a move chosen for an old position is refused"""
+        client = await self.connect()
+        await self.request(client, 'NEW')
+        await self.receive(client)
+        await self.request(client, 'MOVE 1 c7 c6')
+        await self.receive(client)
+        session = self.server.get_session('1')
+        self.assertEqual(
+            await self.server.play(session, client[1], 'a4', 'a5',
+                                   fen=START_FEN),
+            'ERROR game 1 changed during the engine search')
+        self.assertEqual(session.get_game().get_current_turn(), 'red')
+
+    async def test_games_are_dropped_when_players_leave(self):
+        """SERVER: test that a game nobody follows is forgotten"""
+        blue = await self.connect()
+        red = await self.connect()
+        await self.request(blue, 'NEW')
+        await self.receive(blue)
+        await self.request(red, 'JOIN 1')
+        self.assertEqual(await self.request(blue, 'QUIT'), 'BYE')
+        self.assertEqual(await self.request(red, 'STATE 1'),
+                         'STATE 1 UNFINISHED ' + START_FEN)
+        self.assertEqual(await self.request(red, 'QUIT'), 'BYE')
+        for _ in range(100):
+            if self.server.get_session('1') is None:
+                break
+            await asyncio.sleep(0.01)
+        self.assertIsNone(self.server.get_session('1'))
+
+    async def test_errors(self):
+        """SERVER: test answers to bad requests"""
+        client = await self.connect()
+        self.assertEqual(await self.request(client, 'JOIN 7'),
+                         'ERROR no game 7')
+        self.assertEqual(await self.request(client, 'HELLO'),
+                         'ERROR unknown command HELLO')
+        self.assertEqual(await self.request(client, 'MOVE 1'),
+                         'ERROR wrong arguments for MOVE')
+        self.assertEqual(await self.request(client, 'STATE 1 2'),
+                         'ERROR wrong arguments for STATE')
+        await self.request(client, 'NEW')
+        await self.receive(client)
+        for seconds in ('nan', 'inf', '-1', '0', 'soon'):
+            self.assertEqual(
+                await self.request(client, 'ENGINE 1 %s' % seconds),
+                'ERROR bad time %s' % seconds)
+        self.assertEqual(await self.request(client, 'QUIT'), 'BYE')
+
+
+class TestBitBoard(unittest.TestCase):
+    def test_checkmate_is_detected_on_bit_board(self):
+        """BIT BOARD: test that a full game plays the same as on lists"""
+        list_game = JanggiGame(ListBoard)
+        bit_game = JanggiGame(BitBoard)
+        for start, end in CHECKMATE_GAME:
+            self.assertIs(bit_game.make_move(start, end),
+                          list_game.make_move(start, end))
+            self.assertEqual(bit_game.get_position(),
+                             list_game.get_position())
+            self.assertEqual(bit_game.get_hash(), list_game.get_hash())
+        self.assertEqual(bit_game.get_game_state(), 'RED_WON')
+
+    def test_masks_follow_the_pieces(self):
+        """BIT BOARD: test that the occupancy masks track moved pieces"""
+        g = JanggiGame(BitBoard)
+        board = BitBoard(g.get_position())
+        self.assertEqual(bin(board.get_occupied()).count('1'), 32)
+        red_chariot = PIECE_CODES['red', 'chariot']
+        self.assertEqual(board.get_mask(red_chariot), 1 << 0 | 1 << 8)
+        board.set_piece([0, 0], None)
+        board.set_piece([2, 0], Piece('red', 'chariot', 'C'))
+        self.assertEqual(board.get_mask(red_chariot), 1 << 18 | 1 << 8)
+        self.assertEqual(bin(board.get_occupied()).count('1'), 32)
+
+    def test_between_counts_match_list_board(self):
+        """BIT BOARD: test blocking and screen counts against ListBoard"""
+        g = bench.setup_position('late')
+        bit_board = BitBoard(g.get_position())
+        list_board = ListBoard(g.get_position())
+        for origin, targets in enumerate(BETWEEN):
+            for target in targets:
+                self.assertEqual(bit_board.count_between(origin, target),
+                                 list_board.count_between(origin, target))
+                self.assertEqual(
+                    bit_board.count_cannons_between(origin, target),
+                    list_board.count_cannons_between(origin, target))
+
+
+class TestProfiling(unittest.TestCase):
+    def test_profile_counts_calls(self):
+        """PROFILING: test that a profiled block counts pipeline calls"""
+        plain_method = JanggiGame.test_checks
+        g = JanggiGame()
+        with profiling.profile() as stats:
+            for start, end in CHECKMATE_GAME:
+                g.make_move(start, end)
+            self.assertIsNot(JanggiGame.test_checks, plain_method)
+        self.assertIs(JanggiGame.test_checks, plain_method)
+        self.assertIs(profiling.is_enabled(), False)
+        numbers = stats.get_stats()
+        self.assertEqual(set(numbers), set(profiling.PROFILED_METHODS))
+        self.assertEqual(numbers['test_checks']['calls'],
+                         len(CHECKMATE_GAME))
+        self.assertGreater(numbers['checkmate_checker']['calls'], 0)
+        self.assertGreater(numbers['test_checks']['ns'], 0)
+        self.assertEqual(json.loads(stats.to_json()), numbers)
+        g.make_move('a1', 'a2')  # Not counted once profiling is off
+        self.assertEqual(profiling.get_stats(), numbers)
+
+    def test_environment_variable_enables_profiling(self):
+        """PROFILING: test that JANGGI_PROFILE=1 profiles a process"""
+        for imports in ('Janggi, profiling', 'profiling, Janggi'):
+            script = ('import %s\n'
+                      'Janggi.JanggiGame().make_move("c7", "c6")\n'
+                      'print(profiling.to_json())' % imports)
+            output = subprocess.run(
+                [sys.executable, '-c', script],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                env=dict(os.environ, JANGGI_PROFILE='1'),
+                capture_output=True, text=True, check=True).stdout
+            numbers = json.loads(output)
+            self.assertEqual(numbers['test_checks']['calls'], 1)
+            self.assertGreater(numbers['is_general_attacked']['calls'], 0)
+
+
+class TestPiece(unittest.TestCase):
+    def test_pieces_are_shared(self):
+        """PIECE: test that each team and type has one shared Piece"""
+        chariot = Piece('red', 'chariot', 'C')
+        self.assertIs(Piece('red', 'chariot'), chariot)
+        self.assertIsNot(Piece('blue', 'chariot'), chariot)
+        self.assertEqual(Piece('blue', 'chariot').get_image(), 'c')
+        self.assertIs(copy.deepcopy(chariot), chariot)
+        self.assertIs(pickle.loads(pickle.dumps(chariot)), chariot)
+        g = JanggiGame()
+        self.assertIs(g.get_piece([0, 0]), g.get_piece([0, 8]))
+
+    def test_pieces_cannot_be_changed(self):
+        """PIECE: test that shared pieces are immutable"""
+        soldier = Piece('red', 'soldier', 'S')
+        with self.assertRaises(AttributeError):
+            soldier._team = 'blue'
+        with self.assertRaises(AttributeError):
+            soldier.extra = 1
+        self.assertIsInstance(soldier.get_moves(), tuple)
+        with self.assertRaises(ValueError):
+            Piece('red', 'soldier', 'X')
+        with self.assertRaises(ValueError):
+            Piece('red', 'king', 'K')
+
+    def test_blocked_squares(self):
+        """PIECE: test the squares that block horse and elephant moves"""
+        self.assertEqual(Piece('red', 'horse').get_blocked([2, 1]),
+                         ((1, 0),))
+        self.assertEqual(Piece('blue', 'elephant').get_blocked((-3, 2)),
+                         ((-1, 0), (-2, 1)))
+        self.assertIs(Piece('red', 'chariot').get_blocked((0, 1)), False)
+
+
+class TestNotation(unittest.TestCase):
+    def test_notation_tables(self):
+        """NOTATION: test converting every square to notation and back"""
+        g = JanggiGame()
+        self.assertEqual(g.convert_algebraic_notation('a1'), (0, 0))
+        self.assertEqual(g.convert_algebraic_notation('b10'), (9, 1))
+        self.assertEqual(g.convert_algebraic_notation('i10'), (9, 8))
+        for name in SQUARE_NAMES:
+            self.assertEqual(g.convert_to_algebraic_notation(
+                g.convert_algebraic_notation(name)), name)
+        with self.assertRaises(KeyError):
+            g.convert_algebraic_notation('j1')
+
+    def test_squares_handed_out_are_immutable(self):
+        """NOTATION: test that the squares handed out cannot be changed, so
+        that they can be shared with the square tables"""
+        g = JanggiGame()
+        g.make_move('e9', 'e8')
+        start, end = parse_moves('e2e3')[0]
+        g.set_general_square('red', [2, 4])  # Stored as the shared square
+        for square in (g.convert_algebraic_notation('e9'), start, end,
+                       g.get_general_square('blue'),
+                       g.get_general_square('red'),
+                       next(iter(g.legal_moves('red')))[0]):
+            with self.assertRaises(TypeError):
+                square[0] = 5
+        self.assertIs(g.get_general_square('red'), end)
+        self.assertEqual(g.convert_algebraic_notation('e8'), (7, 4))
+
+    def test_parse_moves(self):
+        """NOTATION: test parsing a list of moves"""
+        self.assertEqual(parse_moves('b3b10 a10a9 i1i2'),
+                         [((2, 1), (9, 1)), ((9, 0), (8, 0)),
+                          ((0, 8), (1, 8))])
+        self.assertEqual(parse_moves(''), [])
+        text = ' '.join(start + end for start, end in CHECKMATE_GAME)
+        g = JanggiGame()
+        for start, end in parse_moves(text):
+            self.assertIs(g.make_move(g.convert_to_algebraic_notation(start),
+                                      g.convert_to_algebraic_notation(end)),
+                          True)
+        self.assertEqual(g.get_game_state(), 'RED_WON')
+        for text in ('b3', 'b3b11', 'b3x4', 'b3b4b5'):
+            with self.assertRaises(ValueError):
+                parse_moves(text)
+
+
+class TestFen(unittest.TestCase):
+    def test_starting_setup(self):
+        """FEN: test the position string of the starting setup"""
+        self.assertEqual(JanggiGame().to_fen(), START_FEN)
+        g = JanggiGame.from_fen(START_FEN)
+        self.assertEqual(g.get_position(), JanggiGame().get_position())
+        self.assertEqual(g.get_hash(), JanggiGame().get_hash())
+        self.assertEqual(g.get_score(), JanggiGame().get_score())
+        self.assertEqual(list(JanggiGame(setup=False).get_position()),
+                         [0] * 90)
+
+    def test_positions_round_trip(self):
+        """FEN: test that loading a position string restores the board,
+        generals, turn and checks"""
+        for name in bench.POSITIONS:
+            g = bench.setup_position(name)
+            copy = JanggiGame.from_fen(g.to_fen(), ArrayBoard)
+            self.assertEqual(copy.to_fen(), g.to_fen())
+            self.assertEqual(copy.get_position(), g.get_position())
+            self.assertEqual(copy.get_hash(), g.get_hash())
+            for team in ('red', 'blue'):
+                self.assertEqual(copy.get_general_square(team),
+                                 g.get_general_square(team))
+                self.assertEqual(copy.is_in_check(team), g.is_in_check(team))
+        self.assertTrue(bench.setup_position('check').to_fen().endswith(
+            ' b b'))
+
+    def test_play_continues_from_a_loaded_position(self):
+        """FEN: test that a game loaded mid-way finishes like the
+        original"""
+        g = JanggiGame()
+        for start, end in CHECKMATE_GAME[:-1]:
+            g.make_move(start, end)
+        copy = JanggiGame.from_fen(g.to_fen())
+        self.assertIs(copy.make_move(*CHECKMATE_GAME[-1]), True)
+        self.assertEqual(copy.get_game_state(), 'RED_WON')
+
+    def test_bad_position_strings(self):
+        """FEN: test that malformed position strings are refused"""
+        g = JanggiGame()
+        for fen in (START_FEN[:-2], START_FEN.replace('b -', 'x -'),
+                    START_FEN.replace('/9/9/', '/9/'),
+                    START_FEN.replace('4G4', '4G3'),
+                    START_FEN.replace('4G4', '9'),
+                    START_FEN.replace('S1S1S', 'S1Z1S')):
+            with self.assertRaises(ValueError):
+                g.load_fen(fen)
+        self.assertEqual(g.to_fen(), START_FEN)
+
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class TestTensor(unittest.TestCase):
+    def test_arrays_round_trip_games(self):
+        """TENSOR: test that games survive conversion to an array and back"""
+        games = [bench.setup_position(name) for name in bench.POSITIONS]
+        positions = tensor.games_to_array(games)
+        self.assertEqual(positions.shape, (len(games), 10, 9))
+        self.assertEqual(positions.dtype, numpy.int8)
+        turns = [game.get_current_turn() for game in games]
+        for game, rebuilt in zip(games, tensor.array_to_games(positions,
+                                                              turns)):
+            self.assertEqual(rebuilt.get_position(), game.get_position())
+            self.assertEqual(rebuilt.get_hash(), game.get_hash())
+            self.assertEqual(rebuilt.get_score(), game.get_score())
+            self.assertEqual(rebuilt.get_general_square('red'),
+                             game.get_general_square('red'))
+            self.assertEqual(rebuilt.get_general_square('blue'),
+                             game.get_general_square('blue'))
+
+    def test_positions_need_both_generals(self):
+        """TENSOR: test that a position without a general is refused"""
+        positions = tensor.games_to_array([JanggiGame()])
+        positions[0, 8, 4] = 0  # Blue general
+        with self.assertRaises(ValueError):
+            tensor.array_to_games(positions)
+
+    def test_material_and_piece_counts(self):
+        """TENSOR: test vectorized material and piece counts"""
+        games = [JanggiGame(), bench.setup_position('late')]
+        positions = tensor.games_to_array(games)
+        for number, game in enumerate(games):
+            totals = {'red': 0, 'blue': 0}
+            for square, piece in game.get_pieces():
+                totals[piece.get_team()] += \
+                    evaluation.PIECE_VALUES[piece.get_type()]
+            self.assertEqual(tensor.material(positions)[number].tolist(),
+                             [totals['red'], totals['blue']])
+        counts = tensor.piece_counts(positions)
+        self.assertEqual(counts.shape, (2, 2, 7))
+        self.assertEqual(counts[0].tolist(), [[1, 2, 2, 2, 2, 2, 5]] * 2)
+        self.assertEqual(counts[1].sum(), len(list(games[1].get_pieces())))
+
+    def test_generals_in_palace(self):
+        """TENSOR: test which generals stand in a palace"""
+        positions = tensor.games_to_array([JanggiGame(), JanggiGame()])
+        positions[1, 1, 4] = 0
+        positions[1, 4, 4] = tensor.PIECE_CODES['red', 'general']
+        self.assertEqual(tensor.generals_in_palace(positions).tolist(),
+                         [[True, True], [False, True]])
+
+
+class TestReplay(unittest.TestCase):
+    GAMES = [CHECKMATE_GAME,
+             [('c7', 'c6'), ('c1', 'd3'), ('a1', 'a2'), ('c6', 'c5')],
+             [('c7', 'c6'), ('z1', 'c2')],
+             [],
+             [('c7', 'c6'), ('c1',)],
+             'c7c6 c1d3',
+             ['c7c6', 'c1'],
+             CHECKMATE_GAME]
+
+    def check_results(self, results):
+        """Checks the replay results of GAMES."""
+        self.assertEqual([result.get_game_number() for result in results],
+                         list(range(len(self.GAMES))))
+        self.assertEqual(results[0].get_game_state(), 'RED_WON')
+        self.assertTrue(results[0].is_valid())
+        self.assertEqual(results[0].get_moves_played(), len(CHECKMATE_GAME))
+        self.assertEqual(results[0].get_checks()[-1],
+                         (len(CHECKMATE_GAME) - 1, 'blue'))
+        self.assertEqual(results[1].get_illegal_move(), 2)
+        self.assertEqual(results[1].get_moves_played(), 2)
+        self.assertEqual(results[2].get_illegal_move(), 1)
+        self.assertEqual(results[3].get_game_state(), 'UNFINISHED')
+        self.assertEqual(results[3].get_checks(), [])
+        self.assertEqual(results[4].get_illegal_move(), 1)
+        self.assertTrue(results[5].is_valid())
+        self.assertEqual(results[5].get_moves_played(), 2)
+        self.assertEqual(results[6].get_illegal_move(), 1)
+        self.assertEqual(results[7].get_game_state(), 'RED_WON')
+
+    def test_replay_in_process(self):
+        """REPLAY: test validating games without worker processes"""
+        self.check_results(list(replay.replay_games(self.GAMES, workers=1)))
+
+    def test_replay_in_worker_processes(self):
+        """REPLAY: test validating games over a process pool"""
+        self.check_results(list(replay.replay_games(iter(self.GAMES),
+                                                    workers=2, chunksize=1)))
+
+
 if __name__ == '__main__':
     unittest.main()
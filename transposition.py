@@ -0,0 +1,126 @@
+# Description: A fixed-size transposition table in shared memory, so that
+# search processes working on the same game share what they have searched.
+# Each entry is written without a lock as two 64-bit words: the packed
+# result, and the position hash XORed with it. A reader that finds an entry
+# half written by another process sees a hash that does not match, and
+# treats it as empty.
+#     table = SharedTranspositionTable(1 << 20)
+#     Searcher(game, table=table).search(time_limit=5.0)
+
+import struct
+from multiprocessing import shared_memory
+
+# Kinds of stored score: the exact score, or a bound on it from a cutoff.
+EXACT = 0
+LOWER = 1  # The score is at least the stored score
+UPPER = 2  # The score is at most the stored score
+
+DEFAULT_ENTRIES = 1 << 18
+# Entry: position hash XOR data, then data.
+ENTRY = struct.Struct('<QQ')
+# Data: score, depth, bound, and the best move's start and end square
+# indices, or NO_SQUARE.
+DATA = struct.Struct('<iBBBB')
+NO_SQUARE = 255
+MASK = (1 << 64) - 1
+
+
+class SharedTranspositionTable:
+    """Stores search results by position hash in a shared memory block.
+    Pickling the table, such as when passing it to a worker process, sends
+    only the block's name, and the copy attaches to the same block."""
+
+    def __init__(self, entries=DEFAULT_ENTRIES, name=None):
+        """
+        Creates a table, or attaches to one created by another process.
+        :param entries: Number of entries, rounded down to a power of two.
+        :param name: Name of an existing block to attach to, or None to
+        create a new block.
+        """
+        entries = 1 << max(int(entries).bit_length() - 1, 0)
+        self._owner = name is None
+        if self._owner:
+            self._memory = shared_memory.SharedMemory(
+                create=True, size=entries * ENTRY.size)
+            self._memory.buf[:entries * ENTRY.size] = \
+                bytes(entries * ENTRY.size)
+        else:
+            self._memory = shared_memory.SharedMemory(name)
+        self._entries = entries
+        self._mask = entries - 1
+
+    def __reduce__(self):
+        return SharedTranspositionTable, (self._entries, self.get_name())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Detaches from the block, and frees it if this table created
+        it."""
+        if self._memory is None:
+            return
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+        self._memory = None
+
+    def get_name(self):
+        """Returns the name other processes attach to the block with."""
+        return self._memory.name
+
+    def get_entries(self):
+        """Returns the number of entries."""
+        return self._entries
+
+    def clear(self):
+        """Empties every entry."""
+        self._memory.buf[:self._entries * ENTRY.size] = \
+            bytes(self._entries * ENTRY.size)
+
+    def store(self, key, depth, bound, score, move=None):
+        """
+        Stores a search result, replacing the entry in its slot unless that
+        holds the same position searched deeper.
+        :param key: Position hash, as returned by JanggiGame.get_hash().
+        :param depth: Depth the position was searched to.
+        :param bound: EXACT, LOWER or UPPER.
+        :param score: Score for the side to move.
+        :param move: Best (start, end) move in [y, x] squares, or None.
+        :return: None.
+        """
+        offset = (key & self._mask) * ENTRY.size
+        buffer = self._memory.buf
+        check, data = ENTRY.unpack_from(buffer, offset)
+        if check ^ data == key and data and \
+                DATA.unpack(data.to_bytes(8, 'little'))[1] > depth:
+            return  # Keep the deeper result
+        if move is None:
+            origin = target = NO_SQUARE
+        else:
+            origin = move[0][0] * 9 + move[0][1]
+            target = move[1][0] * 9 + move[1][1]
+        data = int.from_bytes(DATA.pack(score, min(depth, 255), bound,
+                                        origin, target), 'little')
+        ENTRY.pack_into(buffer, offset, (key ^ data) & MASK, data)
+
+    def probe(self, key):
+        """
+        Looks up a position.
+        :param key: Position hash.
+        :return: Tuple of depth, bound, score and best move as a tuple of
+        start and end square indices or None, or None if the position is
+        not in the table.
+        """
+        check, data = ENTRY.unpack_from(self._memory.buf,
+                                        (key & self._mask) * ENTRY.size)
+        if not data or check ^ data != key:
+            return None
+        score, depth, bound, origin, target = DATA.unpack(
+            data.to_bytes(8, 'little'))
+        if origin == NO_SQUARE:
+            return depth, bound, score, None
+        return depth, bound, score, (origin, target)